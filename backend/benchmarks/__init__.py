@@ -0,0 +1,34 @@
+import os
+import sys
+
+# Stub upstream has no quota, benchmarks mustn't be throttled by governor
+os.environ.setdefault("UPSTREAM_DAILY_QUOTA", "0")
+os.environ.setdefault("UPSTREAM_RATE", "1000000")
+# and accepts any api key
+os.environ.setdefault("API_KEYS", "stub")
+
+# Benchmarks fill redis with cache entries, geo index and counters of the stub
+# upstream, so they use their own database rather than the production one
+_PRODUCTION_DB = os.getenv("REDIS_DB", "0")
+os.environ["REDIS_DB"] = os.getenv("BENCHMARK_REDIS_DB", "15")
+# Marks the database as used by benchmarks
+_MARKER_KEY = "benchmarks"
+
+
+def require_benchmark_db():
+    """
+    Exits unless redis database of benchmarks is a dedicated one: it isn't
+    `REDIS_DB` and it's either empty or has been used by benchmarks before.
+    """
+
+    from forecasty import cache
+
+    database = os.environ["REDIS_DB"]
+    if database == _PRODUCTION_DB:
+        sys.exit("BENCHMARK_REDIS_DB must differ from REDIS_DB")
+    if cache._r.dbsize() and not cache._r.exists(_MARKER_KEY):
+        sys.exit(
+            f"Redis database {database} isn't empty, "
+            "point BENCHMARK_REDIS_DB to a dedicated one"
+        )
+    cache._r.set(_MARKER_KEY, 1)
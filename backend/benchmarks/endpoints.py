@@ -0,0 +1,62 @@
+"""
+Measures CPU time the WSGI backend spends per request of each endpoint. The
+provider parses canned payloads instead of calling upstream and caching, so
+it's the cost of routing, parsing and rendering. Needs running redis for
+popularity counters.
+
+    python -m benchmarks.endpoints [ITERATIONS]
+"""
+
+import sys
+import time
+
+import forecasty
+from forecasty import api
+from . import require_benchmark_db
+from .stub import _conditions, _daily, _geo, _hourly
+
+_ENDPOINTS = {
+    "current": "/accu/currentconditions?location=Москва",
+    "12 hours": "/accu/forecast/12hours?location=Москва",
+    "5 days": "/accu/forecast/5days?location=55.7512,37.6184",
+    "batch of 10": "/accu/batch?kind=current" + "&location=Москва" * 10,
+    "geo complete": "/geo/complete?prefix=мос",
+}
+
+
+class StubProvider(api.AccuWeatherBase, api.Provider):
+    def __init__(self):
+        super().__init__(api_key="stub")
+        self._payloads = {
+            api.ForecastDelta.hour: {longs: _hourly(longs) for longs in (12, 120)},
+            api.ForecastDelta.day: {longs: _daily(longs) for longs in (5, 15)},
+        }
+
+    def get_geo(self, search_string=None, longitude=None, latitude=None):
+        data = _geo("294021")
+        return self._parse_geo(data if search_string is None else [data], search_string)
+
+    def get_conditions(self, geo, approximate=False):
+        return self._parse_conditions(_conditions(), geo)
+
+    def get_forecast(self, geo, delta, longs):
+        return self._parse_forecast(self._payloads[delta][longs], geo, delta)
+
+
+def main(iterations: int):
+    require_benchmark_db()
+    client = forecasty.make_app(StubProvider).test_client()
+    for name, url in _ENDPOINTS.items():
+        for _ in range(10):
+            client.get(url)
+        cpu, wall = time.process_time(), time.perf_counter()
+        for _ in range(iterations):
+            response = client.get(url)
+            assert response.status_code == 200, response.text
+        cpu = (time.process_time() - cpu) / iterations
+        wall = (time.perf_counter() - wall) / iterations
+        print(f"{name:<14} cpu {cpu * 1e6:8.1f} us  wall {wall * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
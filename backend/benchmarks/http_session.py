@@ -0,0 +1,39 @@
+"""
+Compares latency of upstream calls made with one-off `requests.get` (new
+connection per call) and with the provider's pooled keep-alive session.
+
+    python -m benchmarks.http_session [CALLS]
+"""
+
+import sys
+import time
+import requests
+
+from forecasty import api
+from . import require_benchmark_db
+from .stub import StubAccuWeather
+
+
+def _measure(name, get, url, calls):
+    latencies = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        get(url, params={"apikey": "", "details": "true"}, timeout=5).json()
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+    print(f"{name:<10} p50 {p50 * 1e3:7.3f} ms  p99 {p99 * 1e3:7.3f} ms")
+
+
+def main(calls: int):
+    require_benchmark_db()
+    with StubAccuWeather(latency=0) as stub:
+        url = f"{stub.url}/forecasts/v1/daily/5day/294021"
+        _measure("one-off", requests.get, url, calls)
+        provider = api.AccuWeather(domain=stub.url)
+        _measure("session", provider._session.get, url, calls)
+        provider.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,92 @@
+"""
+Compares WSGI (gunicorn sync workers) and ASGI (gunicorn uvicorn workers)
+backends under concurrent load. Every request geocodes unique coordinates, so
+it waits for the stub upstream once, like a cache miss does. Needs running
+redis.
+
+    python -m benchmarks.load_test [REQUESTS] [CONCURRENCY] [WORKERS]
+"""
+
+import os
+import sys
+import time
+import httpx
+import random
+import asyncio
+import subprocess
+
+from forecasty.wsgi import WORKER_TIMEOUT
+from . import require_benchmark_db
+from .stub import StubAccuWeather
+
+_SERVERS = {
+    "wsgi": ("forecasty:make_app()", "sync"),
+    "asgi": ("forecasty:make_asgi_app()", "uvicorn.workers.UvicornWorker"),
+}
+
+
+def _start_server(app: str, worker_class: str, workers: int, port: int, stub_url):
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            *("-m", "gunicorn", app),
+            *("--bind", f"127.0.0.1:{port}"),
+            *("--workers", str(workers)),
+            *("--worker-class", worker_class),
+            *("--log-level", "warning"),
+            *("--timeout", str(WORKER_TIMEOUT)),
+        ],
+        env={**os.environ, "ACCUWEATHER_DOMAIN": stub_url},
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/stats/cache")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError(f"{app} hasn't started")
+
+
+async def _load(url: str, requests: int, concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def request(client):
+        location = f"{random.uniform(-90, 90)},{random.uniform(-180, 180)}"
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(url, params={"location": location})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        await asyncio.gather(*(request(client) for _ in range(requests)))
+    return latencies
+
+
+def main(requests: int, concurrency: int, workers: int):
+    require_benchmark_db()
+    with StubAccuWeather(latency=0.2) as stub:
+        for port, (name, (app, worker_class)) in enumerate(_SERVERS.items(), 5100):
+            server = _start_server(app, worker_class, workers, port, stub.url)
+            try:
+                url = f"http://127.0.0.1:{port}/accu/currentconditions"
+                started = time.perf_counter()
+                latencies = sorted(asyncio.run(_load(url, requests, concurrency)))
+                elapsed = time.perf_counter() - started
+            finally:
+                server.terminate()
+                server.wait()
+            p50 = latencies[len(latencies) // 2]
+            p99 = latencies[int(len(latencies) * 0.99)]
+            print(
+                f"{name}: {requests / elapsed:7.1f} req/s, "
+                f"p50 {p50 * 1e3:7.1f} ms, p99 {p99 * 1e3:7.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args, *(500, 50, 2)[len(args) :])
@@ -0,0 +1,97 @@
+"""
+Compares parse time of 120-hour and 5-day payloads by per-unit models (as
+forecasts were parsed before) and by columns, with and without rendering
+the forecast to json. Doesn't need redis.
+
+    python -m benchmarks.parse_forecast [ITERATIONS]
+"""
+
+import sys
+import time
+
+from forecasty import api
+from .stub import _daily, _hourly
+
+_GEO = api.Geo(id="294021", name="Москва", longitude=37.6184, latitude=55.7512)
+
+
+def _weather(geo, date, description, temperature_f, wind, humidity, precipitation):
+    conds = api.WeatherConditions(
+        temperature_c=api.fahrenheit_to_celsius(temperature_f),
+        wind_speed_ms=wind,
+        humidity_percent=humidity,
+        precipitation_probability_percent=precipitation,
+    )
+    return api.Weather(
+        geo=geo,
+        date=date,
+        conditions=conds,
+        favorable=conds.is_favorable(),
+        description=description,
+    )
+
+
+def _units_hourly(data, geo) -> api.Forecast:
+    units = [
+        _weather(
+            geo,
+            hour["DateTime"],
+            hour["IconPhrase"],
+            hour["WetBulbTemperature"]["Value"],
+            hour["Wind"]["Speed"]["Value"],
+            hour["RelativeHumidity"],
+            hour["PrecipitationProbability"],
+        )
+        for hour in data
+    ]
+    return api.Forecast(units=units, delta=api.ForecastDelta.hour)
+
+
+def _units_daily(data, geo) -> api.Forecast:
+    units = [
+        _weather(
+            geo,
+            forecast["Date"],
+            forecast["Day"]["LongPhrase"],
+            forecast["Day"]["WetBulbTemperature"]["Average"]["Value"],
+            forecast["Day"]["Wind"]["Speed"]["Value"],
+            forecast["Day"]["RelativeHumidity"]["Average"],
+            forecast["Day"]["PrecipitationProbability"],
+        )
+        for forecast in data["DailyForecasts"]
+    ]
+    return api.Forecast(units=units, delta=api.ForecastDelta.hour)
+
+
+def _measure(name, parse, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        parse()
+    elapsed = (time.perf_counter() - started) / iterations
+    print(f"  {name:<16} {elapsed * 1e6:>9.1f} us")
+
+
+def main(iterations: int):
+    provider = api.AccuWeatherBase(api_key="stub")
+    payloads = (
+        ("120 hours", _hourly(120), _units_hourly, api.ForecastDelta.hour),
+        ("5 days", _daily(5), _units_daily, api.ForecastDelta.day),
+    )
+    for name, data, parse_units, delta in payloads:
+        print(f"{name}:")
+
+        def columns():
+            return provider._parse_forecast(data, _GEO, delta)
+
+        _measure("units", lambda: parse_units(data, _GEO), iterations)
+        _measure("columns", columns, iterations)
+        _measure(
+            "units+json",
+            lambda: parse_units(data, _GEO).model_dump_json(),
+            iterations,
+        )
+        _measure("columns+json", lambda: columns().model_dump_json(), iterations)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
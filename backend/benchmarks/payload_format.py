@@ -0,0 +1,71 @@
+"""
+Compares size in redis and hit latency of the legacy cache entry format
+(json-in-json string) with the current one (redis hash, optionally
+compressed) for 120-hour and 5-day payloads. Needs running redis.
+
+    python -m benchmarks.payload_format [ITERATIONS]
+"""
+
+import sys
+import json
+import time
+
+from forecasty import cache
+from .stub import _daily, _hourly
+
+
+def _stored_bytes(key) -> int:
+    if cache._r.type(key) == b"hash":
+        return sum(len(k) + len(v) for k, v in cache._r.hgetall(key).items())
+    return cache._r.strlen(key)
+
+
+def _measure(name, write, read, iterations):
+    key = f"bench:payload:{name}"
+    write(key)
+    size = _stored_bytes(key)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        read(key)
+    elapsed = (time.perf_counter() - started) / iterations
+    cache._r.delete(key)
+    print(f"  {name:<12} {size:>9} B in redis {elapsed * 1e6:>9.1f} us/hit")
+
+
+def _legacy_write(output):
+    def write(key):
+        dump = cache._FuncCacheDump(timestamp=0, output=json.dumps(output))
+        cache._r.set(key, dump.model_dump_json())
+
+    return write
+
+
+def _legacy_read(key):
+    return json.loads(
+        cache._FuncCacheDump.model_validate_json(cache._r.get(key)).output
+    )
+
+
+def _current(compress_min_bytes, output):
+    memcache = cache.MemCache(cache._r, compress_min_bytes=compress_min_bytes)
+
+    def write(key):
+        encoded = json.dumps(output, ensure_ascii=False).encode("utf-8")
+        memcache.cache_func(key, cache.FuncCacheEntry(0, encoded))
+
+    def read(key):
+        return json.loads(memcache.get_func(key).output)
+
+    return write, read
+
+
+def main(iterations: int):
+    for name, output in (("120 hours", _hourly(120)), ("5 days", _daily(5))):
+        print(f"{name}:")
+        _measure("legacy", _legacy_write(output), _legacy_read, iterations)
+        _measure("hash", *_current(0, output), iterations)
+        _measure("hash+zlib", *_current(1, output), iterations)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,49 @@
+"""
+Fires N concurrent cache misses for the same forecast and checks that the stub
+upstream is called exactly once. Needs running redis (see REDIS_* env vars).
+
+    python -m benchmarks.single_flight [N]
+"""
+
+import sys
+import time
+import threading
+
+from forecasty import api, cache
+from concurrent.futures import ThreadPoolExecutor
+from . import require_benchmark_db
+from .stub import StubAccuWeather
+
+
+def main(concurrency: int):
+    require_benchmark_db()
+    with StubAccuWeather(latency=0.5) as stub:
+        provider = api.AccuWeather(domain=stub.url)
+        geo = api.Geo(id="294021", name="Москва", longitude=37.6184, latitude=55.7512)
+        key = cache._memcache.func_key(
+            api.AccuWeather._get_forecast.__wrapped__,
+            (provider, geo, api.ForecastDelta.hour, 12),
+            {},
+        )
+        cache._memcache.erase_func(key)
+
+        barrier = threading.Barrier(concurrency)
+
+        def miss(_):
+            barrier.wait()
+            return provider.get_forecast(geo, api.ForecastDelta.hour, 12)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            forecasts = list(pool.map(miss, range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    print(f"concurrent misses: {concurrency}")
+    print(f"upstream calls:    {stub.total_calls}")
+    print(f"wall time:         {elapsed:.3f}s")
+    assert all(forecast.longs == 12 for forecast in forecasts)
+    assert stub.total_calls == 1, "misses were not coalesced"
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 32)
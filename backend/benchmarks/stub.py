@@ -0,0 +1,188 @@
+"""
+Local stub of AccuWeather api used by benchmarks. Serves synthetic payloads of
+the same shape as the real ones and counts upstream calls.
+"""
+
+import json
+import time
+import threading
+
+from collections import Counter
+from urllib.parse import urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _geo(key: str, name: str = "Москва") -> dict:
+    return {
+        "Key": key,
+        "LocalizedName": name,
+        "GeoPosition": {"Latitude": 55.7512, "Longitude": 37.6184},
+    }
+
+
+def _conditions() -> list:
+    return [
+        {
+            "LocalObservationDateTime": "2024-10-20T12:00:00+03:00",
+            "WeatherText": "Облачно",
+            "Temperature": {"Imperial": {"Value": 50.0}},
+            "Wind": {"Speed": {"Imperial": {"Value": 8.1}}},
+            "RelativeHumidity": 70,
+            "HasPrecipitation": False,
+        }
+    ]
+
+
+def _value(value: float, unit: str = "F") -> dict:
+    return {"Value": value, "Unit": unit, "UnitType": 18}
+
+
+# Part of the fields returned with details=true which the backend doesn't use,
+# but which make payloads as large as the real ones.
+_DETAILS = {
+    "RealFeelTemperature": {**_value(47.0), "Phrase": "Прохладно"},
+    "RealFeelTemperatureShade": {**_value(46.0), "Phrase": "Прохладно"},
+    "DewPoint": _value(38.0),
+    "WindGust": {"Speed": _value(9.2, "mi/h")},
+    "Visibility": _value(10.0, "mi"),
+    "Ceiling": _value(30000.0, "ft"),
+    "UVIndex": 1,
+    "UVIndexText": "Низкий",
+    "ThunderstormProbability": 0,
+    "RainProbability": 20,
+    "SnowProbability": 0,
+    "IceProbability": 0,
+    "TotalLiquid": _value(0.0, "in"),
+    "Rain": _value(0.0, "in"),
+    "Snow": _value(0.0, "in"),
+    "Ice": _value(0.0, "in"),
+    "CloudCover": 80,
+    "Evapotranspiration": _value(0.01, "in"),
+    "SolarIrradiance": _value(120.3, "W/m²"),
+    "MobileLink": "http://www.accuweather.com/ru/ru/moscow/294021/hourly-weather-forecast/294021",
+    "Link": "http://www.accuweather.com/ru/ru/moscow/294021/hourly-weather-forecast/294021",
+}
+
+
+def _hourly(hours: int) -> list:
+    return [
+        {
+            "DateTime": f"2024-10-20T{hour % 24:02}:00:00+03:00",
+            "EpochDateTime": 1729414800 + hour * 3600,
+            "WeatherIcon": 7,
+            "IconPhrase": "Облачно",
+            "HasPrecipitation": False,
+            "IsDaylight": True,
+            "Temperature": _value(47.0 + hour % 10),
+            "WetBulbTemperature": _value(45.0 + hour % 10),
+            "Wind": {"Speed": _value(3.5, "mi/h"), "Direction": {"Degrees": 180}},
+            "RelativeHumidity": 65,
+            "PrecipitationProbability": 20,
+            **_DETAILS,
+        }
+        for hour in range(hours)
+    ]
+
+
+def _daily(days: int) -> dict:
+    return {
+        "DailyForecasts": [
+            {
+                "Date": f"2024-10-{20 + day:02}T07:00:00+03:00",
+                "EpochDate": 1729396800 + day * 86400,
+                "Temperature": {
+                    "Minimum": _value(40.0 + day),
+                    "Maximum": _value(55.0 + day),
+                },
+                "Day": {
+                    "Icon": 3,
+                    "IconPhrase": "Переменная облачность",
+                    "ShortPhrase": "Переменная облачность",
+                    "LongPhrase": "Переменная облачность",
+                    "WetBulbTemperature": {
+                        "Minimum": _value(44.0 + day),
+                        "Maximum": _value(52.0 + day),
+                        "Average": _value(48.0 + day),
+                    },
+                    "Wind": {"Speed": _value(4.0, "mi/h")},
+                    "RelativeHumidity": {"Minimum": 50, "Maximum": 70, "Average": 60},
+                    "PrecipitationProbability": 10,
+                    **_DETAILS,
+                },
+                "Night": {"IconPhrase": "Облачно", **_DETAILS},
+            }
+            for day in range(days)
+        ]
+    }
+
+
+class StubAccuWeather:
+    """
+    Runs stub server in background thread. Each response is delayed by
+    `latency` seconds to look like a real upstream.
+    """
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def _payload(self, path: str):
+        parts = path.strip("/").split("/")
+        match parts:
+            case ["locations", "v1", "cities", "geoposition", "search"]:
+                return _geo("294021")
+            case ["locations", "v1", "cities", "search"]:
+                return [_geo("294021")]
+            case ["currentconditions", "v1", _key]:
+                return _conditions()
+            case ["forecasts", "v1", "hourly", longs, _key]:
+                return _hourly(int(longs.removesuffix("hour")))
+            case ["forecasts", "v1", "daily", longs, _key]:
+                return _daily(int(longs.removesuffix("day")))
+        return None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep connections alive
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                with stub._lock:
+                    stub.calls[path] += 1
+                time.sleep(stub.latency)
+                payload = stub._payload(path)
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(200 if payload is not None else 404)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -1,17 +1,37 @@
-from . import api
+from . import api, api_async, providers, responses, routes_async
 from flask import Flask
+from quart import Quart
 from flask_cors import CORS
+from quart_cors import cors
+from typing import Callable
 from .routes import forecast_bp
+from .routes_async import async_forecast_bp
 
 
-def make_app():
+def make_app(provider: str | Callable[[], api.Provider] | None = None):
     app = Flask(__name__)
 
     CORS(app)
 
+    providers.init_app(app, provider)
+    responses.init_app(app)
+
     with app.app_context():
         app.register_blueprint(forecast_bp)
 
     print("Application was created successfully")
 
     return app
+
+
+def make_asgi_app(provider: str | Callable[[], api_async.AsyncProvider] | None = None):
+    app = cors(Quart(__name__))
+
+    routes_async.init_app(app, provider)
+    responses.init_async_app(app)
+
+    app.register_blueprint(async_forecast_bp)
+
+    print("ASGI application was created successfully")
+
+    return app
@@ -1,10 +1,25 @@
 import requests
+import functools
+import contextlib
 import json
 import os
-
-from .cache import cached
+import math
+import time
+import random
+import pydantic_core
+
+from . import cache
+from .cache import RAW, cached, track_fallbacks
+from .breaker import CircuitBreaker
+from .keypool import KeyPool, configured_keys
+from .gazetteer import gazetteer
+from .governor import UPSTREAM_MAX_WAIT, governor
+from .geo import geo_index, geo_query, normalize_search_string, snap_coordinate
 from enum import Enum
+from array import array
+from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel
+from requests.adapters import HTTPAdapter
 
 
 class Geo(BaseModel):
@@ -25,19 +40,33 @@ class WeatherConditions(BaseModel):
     precipitation_probability_percent: float
 
     def is_favorable(self) -> bool:
-        return (
-            (-15 <= self.temperature_c <= 30)
-            and (self.precipitation_probability_percent < 50)
-            and (self.wind_speed_ms < 19)
+        return is_favorable(
+            self.temperature_c,
+            self.wind_speed_ms,
+            self.precipitation_probability_percent,
         )
 
 
+def is_favorable(
+    temperature_c: float, wind_speed_ms: float, precipitation_probability_percent: float
+) -> bool:
+    return (
+        (-15 <= temperature_c <= 30)
+        and (precipitation_probability_percent < 50)
+        and (wind_speed_ms < 19)
+    )
+
+
 class Weather(BaseModel):
     geo: Geo
     date: str  # string in iso format
     conditions: WeatherConditions
     favorable: bool
     description: str
+    # served from the last cached data since upstream is unavailable
+    stale: bool = False
+    # taken from forecast of the current hour rather than observed
+    approximate: bool = False
 
 
 class ForecastDelta(str, Enum):
@@ -48,6 +77,7 @@ class ForecastDelta(str, Enum):
 class Forecast(BaseModel):
     units: list[Weather]
     delta: ForecastDelta
+    stale: bool = False
 
     @property
     def geo(self) -> Geo | None:
@@ -59,11 +89,167 @@ class Forecast(BaseModel):
     def longs(self) -> int:
         return len(self.units)
 
+    def compact_dump(self) -> dict:
+        """
+        Compact shape of the forecast: geo is given once and units' fields
+        are columns.
+        """
+
+        geo = self.geo
+        return {
+            "geo": None if geo is None else geo.model_dump(),
+            "delta": self.delta,
+            "stale": self.stale,
+            "dates": [unit.date for unit in self.units],
+            "descriptions": [unit.description for unit in self.units],
+            **{
+                name: [getattr(unit.conditions, name) for unit in self.units]
+                for name in WeatherConditions.model_fields
+            },
+            "favorable": [unit.favorable for unit in self.units],
+        }
+
+    def compact_json(self) -> str:
+        return pydantic_core.to_json(self.compact_dump()).decode("utf-8")
+
 
 def fahrenheit_to_celsius(fahrenheit):
     return (fahrenheit - 32) * 5 / 9
 
 
+class ColumnarForecast:
+    """
+    `Forecast` stored as parallel columns of its units' fields sharing one
+    `Geo`. Units conversion and favorability are computed column by column,
+    and `units` are only built when they're accessed. Renders the same json
+    as `Forecast`, straight from the columns.
+    """
+
+    def __init__(
+        self,
+        geo: Geo,
+        delta: ForecastDelta,
+        dates: list[str],
+        descriptions: list[str],
+        temperature_f: array,
+        wind_speed_ms: array,
+        humidity_percent: array,
+        precipitation_probability_percent: array,
+    ):
+        self._geo = geo
+        self.delta = delta
+        self.stale = False
+        self.dates = dates
+        self.descriptions = descriptions
+        self.temperature_c = array("d", map(fahrenheit_to_celsius, temperature_f))
+        self.wind_speed_ms = wind_speed_ms
+        self.humidity_percent = humidity_percent
+        self.precipitation_probability_percent = precipitation_probability_percent
+        self.favorable = list(
+            map(
+                is_favorable,
+                self.temperature_c,
+                self.wind_speed_ms,
+                self.precipitation_probability_percent,
+            )
+        )
+
+    @property
+    def geo(self) -> Geo | None:
+        return self._geo if self.dates else None
+
+    @property
+    def longs(self) -> int:
+        return len(self.dates)
+
+    def unit(self, i: int) -> Weather:
+        return Weather(
+            geo=self._geo,
+            date=self.dates[i],
+            conditions=WeatherConditions(
+                temperature_c=self.temperature_c[i],
+                wind_speed_ms=self.wind_speed_ms[i],
+                humidity_percent=self.humidity_percent[i],
+                precipitation_probability_percent=(
+                    self.precipitation_probability_percent[i]
+                ),
+            ),
+            favorable=self.favorable[i],
+            description=self.descriptions[i],
+        )
+
+    @functools.cached_property
+    def units(self) -> list[Weather]:
+        return [self.unit(i) for i in range(self.longs)]
+
+    def to_forecast(self) -> Forecast:
+        return Forecast(units=self.units, delta=self.delta, stale=self.stale)
+
+    def model_dump(self) -> dict:
+        geo = self._geo.model_dump()
+        units = [
+            {
+                "geo": geo,
+                "date": date,
+                "conditions": {
+                    "temperature_c": temperature_c,
+                    "wind_speed_ms": wind_speed_ms,
+                    "humidity_percent": humidity_percent,
+                    "precipitation_probability_percent": precipitation,
+                },
+                "favorable": favorable,
+                "description": description,
+                "stale": False,
+                "approximate": False,
+            }
+            for (
+                date,
+                temperature_c,
+                wind_speed_ms,
+                humidity_percent,
+                precipitation,
+                favorable,
+                description,
+            ) in zip(
+                self.dates,
+                self.temperature_c,
+                self.wind_speed_ms,
+                self.humidity_percent,
+                self.precipitation_probability_percent,
+                self.favorable,
+                self.descriptions,
+            )
+        ]
+        return {"units": units, "delta": self.delta, "stale": self.stale}
+
+    def model_dump_json(self) -> str:
+        # pydantic's serializer is several times faster than json module here
+        return pydantic_core.to_json(self.model_dump()).decode("utf-8")
+
+    def compact_dump(self) -> dict:
+        """
+        Same as `Forecast.compact_dump`, the columns are taken as they are.
+        """
+
+        return {
+            "geo": None if self.geo is None else self._geo.model_dump(),
+            "delta": self.delta,
+            "stale": self.stale,
+            "dates": self.dates,
+            "descriptions": self.descriptions,
+            "temperature_c": self.temperature_c.tolist(),
+            "wind_speed_ms": self.wind_speed_ms.tolist(),
+            "humidity_percent": self.humidity_percent.tolist(),
+            "precipitation_probability_percent": (
+                self.precipitation_probability_percent.tolist()
+            ),
+            "favorable": self.favorable,
+        }
+
+    def compact_json(self) -> str:
+        return pydantic_core.to_json(self.compact_dump()).decode("utf-8")
+
+
 def mih_to_ms(mih: float) -> float:
     return mih / 2.237
 
@@ -76,11 +262,45 @@ class Provider:
         latitude: float | None = None,
     ) -> Geo | None: ...
 
-    def get_conditions(self, geo: Geo) -> Weather: ...
+    def get_conditions(self, geo: Geo, approximate: bool = False) -> Weather:
+        """
+        Returns current weather. Approximate one may be derived from already
+        known data (e.g. hourly forecast) to save upstream calls.
+        """
 
     def get_forecast(
         self, geo: Geo, delta: ForecastDelta, longs: int
-    ) -> Forecast | None: ...
+    ) -> Forecast | ColumnarForecast | None: ...
+
+    def get_forecast_json(
+        self, geo: Geo, delta: ForecastDelta, longs: int, compact: bool = False
+    ) -> bytes | None:
+        """
+        Returns forecast already serialized to json, in compact shape if it's
+        asked (see `Forecast.compact_dump`). Providers may cache it to skip
+        parsing and validation of upstream data at all.
+        """
+
+        forecast = self.get_forecast(geo, delta, longs)
+        if forecast is None:
+            return
+        if compact:
+            return forecast.compact_json().encode("utf-8")
+        return forecast.model_dump_json().encode("utf-8")
+
+    def warm(self, geo: Geo, ahead: int, budget: int) -> int:
+        """
+        Refreshes cached weather of the location which gets stale within
+        `ahead` seconds, making at most `budget` upstream calls. Returns
+        number of calls made.
+        """
+
+        return 0
+
+    def close(self):
+        """
+        Releases resources held by provider, e.g. connection pools.
+        """
 
     def __hash__(self):
         return hash(self.__class__.__name__)
@@ -94,54 +314,188 @@ class ApiKeyExpiredError(ApiException):
     pass
 
 
-class AccuWeather(Provider):
-    def __init__(self):
+class UpstreamThrottledError(ApiException):
+    """
+    Upstream call is denied by `governor.Governor` to save api quota.
+    """
+
+
+class UpstreamUnavailableError(ApiException):
+    """
+    Upstream fails or the circuit breaker doesn't let calls to it through.
+    """
+
+
+class UpstreamRequestError(ApiException):
+    """
+    Upstream rejects the request with 4xx status.
+    """
+
+
+# Locations almost never change, while forecasts do. Stale output is served
+# (and refreshed in background) between soft and hard ttl.
+_GEO_SOFT_TTL = 24 * 3600
+_GEO_HARD_TTL = 7 * 24 * 3600
+# Stations report observations about once an hour, so conditions a few minutes
+# old are as good as live ones.
+_CONDITIONS_SOFT_TTL = 10 * 60
+_CONDITIONS_HARD_TTL = 20 * 60
+_FORECAST_SOFT_TTL = 2 * 3600
+_FORECAST_HARD_TTL = 6 * 3600
+# Rendered forecasts are built from cached upstream data, so they're kept
+# shortly and without stale period not to prolong staleness of the latter.
+_RENDERED_FORECAST_TTL = 10 * 60
+# How long the last upstream data is kept to be served while upstream is down
+_CONDITIONS_FALLBACK_TTL = 3 * 3600
+_FORECAST_FALLBACK_TTL = 24 * 3600
+
+# Periods forecasts are available for, shorter ones can be cut from longer
+_FORECAST_LONGS = {
+    ForecastDelta.hour: (1, 12, 24, 72, 120),
+    ForecastDelta.day: (1, 5, 10, 15),
+}
+
+
+ACCUWEATHER_CONNECT_TIMEOUT = float(os.getenv("ACCUWEATHER_CONNECT_TIMEOUT", 3.05))
+ACCUWEATHER_READ_TIMEOUT = float(os.getenv("ACCUWEATHER_READ_TIMEOUT", 10))
+ACCUWEATHER_RETRIES = int(os.getenv("ACCUWEATHER_RETRIES", 2))
+
+# Retried with jittered exponential backoff, along with timeouts and connection
+# errors. Retries are made by providers rather than http clients, since 503 of
+# exhausted quota must not be retried and every attempt is charged to the
+# governor.
+_RETRY_STATUSES = (500, 502, 503, 504)
+
+
+def _retry_backoff(retry: int) -> float:
+    return 0.2 * 2**retry + random.uniform(0, 0.1)
+
+
+# Upper bound of a call making one upstream request: every attempt may wait for
+# the governor and run into both timeouts, with backoffs in between
+_UPSTREAM_CALL_SECS = math.ceil(
+    (ACCUWEATHER_CONNECT_TIMEOUT + ACCUWEATHER_READ_TIMEOUT + UPSTREAM_MAX_WAIT)
+    * (ACCUWEATHER_RETRIES + 1)
+    + sum(0.2 * 2**retry + 0.1 for retry in range(ACCUWEATHER_RETRIES))
+)
+# Rendered forecasts and trips are made of such calls, which may first wait for
+# other workers making them
+_RENDER_CALL_SECS = 2 * _UPSTREAM_CALL_SECS
+
+
+def _make_session() -> requests.Session:
+    pool_size = int(os.getenv("ACCUWEATHER_POOL_SIZE", 10))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class AccuWeatherBase:
+    """
+    Configuration, urls and parsing of AccuWeather api shared by sync and
+    async providers.
+    """
+
+    # Sync and async providers share cached upstream data
+    cache_namespace = "AccuWeather"
+
+    def __init__(self, api_key: str | None = None, domain: str | None = None):
         self._locale = "ru-ru"
-        self._api_key = os.getenv("API_KEY")
-        self._domain = "http://dataservice.accuweather.com"
+        # several keys can be given as comma-separated API_KEYS
+        self._api_keys = configured_keys(api_key)
+        self._domain = domain or os.getenv(
+            "ACCUWEATHER_DOMAIN", "http://dataservice.accuweather.com"
+        )
+        self._timeout = (ACCUWEATHER_CONNECT_TIMEOUT, ACCUWEATHER_READ_TIMEOUT)
+        self._retries = ACCUWEATHER_RETRIES
 
-    def _check_api_key_expiration(self, response):
-        if (
+    def _params(self, api_key: str, **params) -> dict:
+        return {"apikey": api_key, "language": self._locale, **params}
+
+    def _is_api_key_expired(self, response) -> bool:
+        # revoked or invalid keys are rejected with 401 or 403
+        return response.status_code in (401, 403) or (
             "The allowed number of requests has been exceeded".lower()
             in response.text.lower()
-        ):
-            raise ApiKeyExpiredError("Обновите AccuWeather API ключ в .env файле")
+        )
 
-    @cached
-    def _get_geo(
-        self,
-        search_string: str | None = None,
-        longitude: float | None = None,
-        latitude: float | None = None,
-    ):
-        if search_string is None and longitude is None and latitude is None:
+    def _record_response(self, response):
+        # exhausted quota is reported with 503 status, though upstream is fine
+        if self._is_api_key_expired(response):
             return
+        if response.status_code >= 500:
+            self._breaker.record_failure()
+        else:
+            self._breaker.record_success()
+
+    def _check_response(self, status_code: int):
+        # error bodies mustn't be parsed and cached as data
+        if status_code >= 500:
+            raise UpstreamUnavailableError(f"AccuWeather responded with {status_code}")
+        if not 200 <= status_code < 300:
+            raise UpstreamRequestError(
+                f"AccuWeather rejected request with {status_code}"
+            )
+
+    @contextlib.contextmanager
+    def _upstream_call(self):
+        """
+        Block of a single http call to AccuWeather guarded by circuit breaker.
+        """
 
+        with self._breaker.attempt() as allowed:
+            if not allowed:
+                raise UpstreamUnavailableError("AccuWeather circuit breaker is open")
+            yield
+
+    def _geo_url(
+        self,
+        search_string: str | None,
+        longitude: float | None,
+        latitude: float | None,
+    ) -> tuple[str, str]:
         if search_string is None:
             baseurl = f"{self._domain}/locations/v1/cities/geoposition/search"
-            query = f"{longitude},{latitude}"
+            query = f"{latitude},{longitude}"
         else:
             baseurl = f"{self._domain}/locations/v1/cities/search"
             query = search_string
+        return baseurl, query
 
-        response = requests.get(
-            baseurl,
-            params={
-                "apikey": self._api_key,
-                "q": query,
-                "language": self._locale,
-            },
+    def _conditions_url(self, geo: Geo) -> str:
+        return f"{self._domain}/currentconditions/v1/{geo.id}"
+
+    def _forecast_url(self, geo: Geo, delta: ForecastDelta, longs: int) -> str:
+        raw_delta = {
+            ForecastDelta.day: ("daily", "day"),
+            ForecastDelta.hour: ("hourly", "hour"),
+        }[delta]
+        return (
+            f"{self._domain}/forecasts/v1/{raw_delta[0]}/{longs}{raw_delta[1]}/{geo.id}"
         )
-        self._check_api_key_expiration(response)
-        return json.loads(response.text)
 
-    def get_geo(
+    def _normalize_geo_args(
         self,
-        search_string: str | None = None,
-        longitude: float | None = None,
-        latitude: float | None = None,
-    ) -> Geo | None:
-        data = self._get_geo(search_string, longitude, latitude)
+        search_string: str | None,
+        longitude: float | None,
+        latitude: float | None,
+    ) -> tuple[str | None, float | None, float | None]:
+        if search_string is not None:
+            return normalize_search_string(search_string), None, None
+        if longitude is None or latitude is None:
+            return None, None, None
+        return None, snap_coordinate(longitude), snap_coordinate(latitude)
+
+    def _gazetteer_geo(self, search_string: str | None) -> Geo | None:
+        if search_string is None:
+            return
+        if (entry := gazetteer.lookup(search_string)) is None:
+            return
+        return Geo(**entry._asdict())
+
+    def _parse_geo(self, data, search_string: str | None) -> Geo | None:
         if data is None or isinstance(data, list) and len(data) == 0:
             return
         data = data if search_string is None else data[0]
@@ -152,21 +506,8 @@ class AccuWeather(Provider):
             latitude=data["GeoPosition"]["Latitude"],
         )
 
-    def _get_conditions(self, geo: Geo):
-        baseurl = f"{self._domain}/currentconditions/v1/{geo.id}"
-        response = requests.get(
-            baseurl,
-            params={
-                "apikey": self._api_key,
-                "details": "true",
-                "language": self._locale,
-            },
-        )
-        self._check_api_key_expiration(response)
-        return json.loads(response.text)
-
-    def get_conditions(self, geo: Geo) -> Weather:
-        data = self._get_conditions(geo)[0]
+    def _parse_conditions(self, data: list, geo: Geo) -> Weather:
+        data = data[0]
         conds = WeatherConditions(
             temperature_c=fahrenheit_to_celsius(
                 data["Temperature"]["Imperial"]["Value"]
@@ -183,76 +524,44 @@ class AccuWeather(Provider):
             description=data["WeatherText"],
         )
 
-    @cached
-    def _get_forecast(self, geo: Geo, delta: ForecastDelta, longs: int):
-        raw_delta = {
-            ForecastDelta.day: ("daily", "day"),
-            ForecastDelta.hour: ("hourly", "hour"),
-        }[delta]
-        baseurl = (
-            f"{self._domain}/forecasts/v1/{raw_delta[0]}/{longs}{raw_delta[1]}/{geo.id}"
+    def _parse_dayily_forecast(self, data: dict, geo: Geo) -> ColumnarForecast:
+        days = [forecast["Day"] for forecast in data["DailyForecasts"]]
+        return ColumnarForecast(
+            geo=geo,
+            delta=ForecastDelta.hour,
+            dates=[forecast["Date"] for forecast in data["DailyForecasts"]],
+            descriptions=[day["LongPhrase"] for day in days],
+            temperature_f=array(
+                "d", [day["WetBulbTemperature"]["Average"]["Value"] for day in days]
+            ),
+            wind_speed_ms=array("d", [day["Wind"]["Speed"]["Value"] for day in days]),
+            humidity_percent=array(
+                "d", [day["RelativeHumidity"]["Average"] for day in days]
+            ),
+            precipitation_probability_percent=array(
+                "d", [day["PrecipitationProbability"] for day in days]
+            ),
         )
-        response = requests.get(
-            baseurl,
-            params={
-                "apikey": self._api_key,
-                "details": "true",
-                "language": self._locale,
-            },
+
+    def _parse_hourly_forecast(self, data: list, geo: Geo) -> ColumnarForecast:
+        return ColumnarForecast(
+            geo=geo,
+            delta=ForecastDelta.hour,
+            dates=[hour["DateTime"] for hour in data],
+            descriptions=[hour["IconPhrase"] for hour in data],
+            temperature_f=array(
+                "d", [hour["WetBulbTemperature"]["Value"] for hour in data]
+            ),
+            wind_speed_ms=array("d", [hour["Wind"]["Speed"]["Value"] for hour in data]),
+            humidity_percent=array("d", [hour["RelativeHumidity"] for hour in data]),
+            precipitation_probability_percent=array(
+                "d", [hour["PrecipitationProbability"] for hour in data]
+            ),
         )
-        self._check_api_key_expiration(response)
-        return json.loads(response.text)
-
-    def _parse_dayily_forecast(self, data: dict, geo: Geo) -> Forecast:
-        units = []
-        for forecast in data["DailyForecasts"]:
-            conds = WeatherConditions(
-                temperature_c=fahrenheit_to_celsius(
-                    forecast["Day"]["WetBulbTemperature"]["Average"]["Value"]
-                ),
-                wind_speed_ms=forecast["Day"]["Wind"]["Speed"]["Value"],
-                precipitation_probability_percent=forecast["Day"][
-                    "PrecipitationProbability"
-                ],
-                humidity_percent=forecast["Day"]["RelativeHumidity"]["Average"],
-            )
-            units.append(
-                Weather(
-                    geo=geo,
-                    date=forecast["Date"],
-                    conditions=conds,
-                    favorable=conds.is_favorable(),
-                    description=forecast["Day"]["LongPhrase"],
-                )
-            )
-        return Forecast(units=units, delta=ForecastDelta.hour)
-
-    def _parse_hourly_forecast(self, data: dict, geo: Geo) -> Forecast:
-        units = []
-        for forecast in data:
-            conds = WeatherConditions(
-                temperature_c=fahrenheit_to_celsius(
-                    forecast["WetBulbTemperature"]["Value"]
-                ),
-                wind_speed_ms=forecast["Wind"]["Speed"]["Value"],
-                precipitation_probability_percent=forecast["PrecipitationProbability"],
-                humidity_percent=forecast["RelativeHumidity"],
-            )
-            units.append(
-                Weather(
-                    geo=geo,
-                    date=forecast["DateTime"],
-                    conditions=conds,
-                    favorable=conds.is_favorable(),
-                    description=forecast["IconPhrase"],
-                )
-            )
-        return Forecast(units=units, delta=ForecastDelta.hour)
 
-    def get_forecast(
-        self, geo: Geo, delta: ForecastDelta, longs: int
-    ) -> Forecast | None:
-        data = self._get_forecast(geo, delta, longs)
+    def _parse_forecast(
+        self, data, geo: Geo, delta: ForecastDelta
+    ) -> ColumnarForecast | None:
         if data is None:
             return
         match delta:
@@ -260,3 +569,201 @@ class AccuWeather(Provider):
                 return self._parse_dayily_forecast(data, geo)
             case ForecastDelta.hour:
                 return self._parse_hourly_forecast(data, geo)
+
+    def _longer_forecasts(self, delta: ForecastDelta, longs: int) -> list[int]:
+        return [longer for longer in _FORECAST_LONGS[delta] if longer > longs]
+
+    def _cut_forecast(self, data, delta: ForecastDelta, longs: int):
+        match delta:
+            case ForecastDelta.day:
+                return {**data, "DailyForecasts": data["DailyForecasts"][:longs]}
+            case ForecastDelta.hour:
+                return data[:longs]
+
+    def _approximate_conditions(self, data: list, geo: Geo) -> Weather | None:
+        """
+        Takes unit of hourly forecast closest to the current hour.
+        """
+
+        forecast = self._parse_hourly_forecast(data, geo)
+        if forecast.longs == 0:
+            return
+        now = datetime.now(timezone.utc)
+        distances = [abs(datetime.fromisoformat(date) - now) for date in forecast.dates]
+        closest = min(range(forecast.longs), key=distances.__getitem__)
+        if distances[closest] >= timedelta(hours=1):
+            return
+        weather = forecast.unit(closest)
+        weather.approximate = True
+        return weather
+
+
+class AccuWeather(AccuWeatherBase, Provider):
+    def __init__(self, api_key: str | None = None, domain: str | None = None):
+        super().__init__(api_key, domain)
+        self._session = _make_session()
+        self._keys = KeyPool(cache._r, self._api_keys)
+        self._breaker = CircuitBreaker()
+
+    def close(self):
+        self._session.close()
+
+    def _get(self, url: str, api_key: str, **params) -> requests.Response:
+        """
+        A single http call, charged to the governor and guarded by circuit
+        breaker.
+        """
+
+        if not governor.acquire():
+            raise UpstreamThrottledError("AccuWeather api call limit is reached")
+        with self._upstream_call():
+            try:
+                response = self._session.get(
+                    url, params=self._params(api_key, **params), timeout=self._timeout
+                )
+            except (requests.Timeout, requests.ConnectionError):
+                self._breaker.record_failure()
+                raise
+            self._record_response(response)
+        return response
+
+    def _request(self, url: str, **params):
+        retry = 0
+        while (api_key := self._keys.choose()) is not None:
+            try:
+                response = self._get(url, api_key, **params)
+            except (requests.Timeout, requests.ConnectionError):
+                if retry >= self._retries:
+                    raise
+            else:
+                # exhausted quota is reported with 503 status and revoked key
+                # with 401 or 403, the next key is tried at once
+                if self._is_api_key_expired(response):
+                    self._keys.exhaust(api_key)
+                    continue
+                self._keys.record(api_key)
+                if response.status_code not in _RETRY_STATUSES or (
+                    retry >= self._retries
+                ):
+                    self._check_response(response.status_code)
+                    return json.loads(response.text)
+            time.sleep(_retry_backoff(retry))
+            retry += 1
+        raise ApiKeyExpiredError("Обновите AccuWeather API ключ в .env файле")
+
+    @cached(
+        soft_ttl=_GEO_SOFT_TTL, hard_ttl=_GEO_HARD_TTL, call_secs=_UPSTREAM_CALL_SECS
+    )
+    def _get_geo(
+        self,
+        search_string: str | None = None,
+        longitude: float | None = None,
+        latitude: float | None = None,
+    ):
+        if search_string is None and longitude is None and latitude is None:
+            return
+        baseurl, query = self._geo_url(search_string, longitude, latitude)
+        # nothing found isn't cached here, geo index keeps it for a short time
+        return self._request(baseurl, q=query) or None
+
+    def get_geo(
+        self,
+        search_string: str | None = None,
+        longitude: float | None = None,
+        latitude: float | None = None,
+    ) -> Geo | None:
+        search_string, longitude, latitude = self._normalize_geo_args(
+            search_string, longitude, latitude
+        )
+        if search_string is None and longitude is None:
+            return
+        if geo := self._gazetteer_geo(search_string):
+            return geo
+        if search_string is None and (geo := geo_index.nearest(longitude, latitude)):
+            return Geo.model_validate_json(geo)
+        query = geo_query(search_string, longitude, latitude)
+        known, geo = geo_index.lookup(query)
+        if known:
+            return None if geo is None else Geo.model_validate_json(geo)
+        data = self._get_geo(search_string, longitude, latitude)
+        geo = self._parse_geo(data, search_string)
+        geo_index.remember(
+            query, None if geo is None else geo.model_dump_json().encode()
+        )
+        return geo
+
+    @cached(
+        soft_ttl=_CONDITIONS_SOFT_TTL,
+        hard_ttl=_CONDITIONS_HARD_TTL,
+        fallback_ttl=_CONDITIONS_FALLBACK_TTL,
+        call_secs=_UPSTREAM_CALL_SECS,
+    )
+    def _get_conditions(self, geo: Geo):
+        return self._request(self._conditions_url(geo), details="true")
+
+    def get_conditions(self, geo: Geo, approximate: bool = False) -> Weather:
+        if approximate and self._get_conditions.cached_output(self, geo) is None:
+            for longs in _FORECAST_LONGS[ForecastDelta.hour]:
+                data = self._get_forecast.cached_output(
+                    self, geo, ForecastDelta.hour, longs
+                )
+                if data and (weather := self._approximate_conditions(data, geo)):
+                    return weather
+        with track_fallbacks() as fallbacks:
+            data = self._get_conditions(geo)
+        weather = self._parse_conditions(data, geo)
+        weather.stale = bool(fallbacks)
+        return weather
+
+    @cached(
+        soft_ttl=_FORECAST_SOFT_TTL,
+        hard_ttl=_FORECAST_HARD_TTL,
+        fallback_ttl=_FORECAST_FALLBACK_TTL,
+        call_secs=_UPSTREAM_CALL_SECS,
+    )
+    def _get_forecast(self, geo: Geo, delta: ForecastDelta, longs: int):
+        return self._request(self._forecast_url(geo, delta, longs), details="true")
+
+    def _forecast_data(self, geo: Geo, delta: ForecastDelta, longs: int):
+        """
+        Upstream forecast data, cut from cached longer forecast if there's no
+        cached one of this period.
+        """
+
+        for period in (longs, *self._longer_forecasts(delta, longs)):
+            data = self._get_forecast.cached_output(self, geo, delta, period)
+            if data is not None:
+                return self._cut_forecast(data, delta, longs)
+        return self._get_forecast(geo, delta, longs)
+
+    def get_forecast(
+        self, geo: Geo, delta: ForecastDelta, longs: int
+    ) -> ColumnarForecast | None:
+        with track_fallbacks() as fallbacks:
+            data = self._forecast_data(geo, delta, longs)
+        forecast = self._parse_forecast(data, geo, delta)
+        if forecast is not None:
+            forecast.stale = bool(fallbacks)
+        return forecast
+
+    @cached(
+        soft_ttl=_RENDERED_FORECAST_TTL, serializer=RAW, call_secs=_RENDER_CALL_SECS
+    )
+    def get_forecast_json(
+        self, geo: Geo, delta: ForecastDelta, longs: int, compact: bool = False
+    ) -> bytes | None:
+        return super().get_forecast_json(geo, delta, longs, compact)
+
+    def warm(self, geo: Geo, ahead: int, budget: int) -> int:
+        # upstream data behind conditions and forecasts served by routes
+        refreshes = [
+            (self._get_conditions, (geo,)),
+            (self._get_forecast, (geo, ForecastDelta.hour, 12)),
+            (self._get_forecast, (geo, ForecastDelta.day, 5)),
+        ]
+        calls = 0
+        for method, args in refreshes:
+            if calls >= budget:
+                break
+            calls += method.refresh_ahead(ahead, self, *args)
+        return calls
@@ -0,0 +1,225 @@
+import os
+import json
+import httpx
+import asyncio
+
+from . import cache_async
+from .cache import RAW, track_fallbacks
+from .cache_async import async_cached
+from .breaker import CircuitBreaker
+from .keypool import AsyncKeyPool
+from .geo import async_geo_index, geo_query
+from .governor import async_governor
+from .api import (
+    Geo,
+    Weather,
+    Forecast,
+    ForecastDelta,
+    ColumnarForecast,
+    AccuWeatherBase,
+    ApiKeyExpiredError,
+    UpstreamThrottledError,
+    _RETRY_STATUSES,
+    _GEO_SOFT_TTL,
+    _GEO_HARD_TTL,
+    _CONDITIONS_SOFT_TTL,
+    _CONDITIONS_HARD_TTL,
+    _FORECAST_SOFT_TTL,
+    _FORECAST_HARD_TTL,
+    _RENDERED_FORECAST_TTL,
+    _CONDITIONS_FALLBACK_TTL,
+    _FORECAST_FALLBACK_TTL,
+    _FORECAST_LONGS,
+    _UPSTREAM_CALL_SECS,
+    _RENDER_CALL_SECS,
+    _retry_backoff,
+)
+
+
+class AsyncProvider:
+    async def get_geo(
+        self,
+        name: str | None = None,
+        longitude: float | None = None,
+        latitude: float | None = None,
+    ) -> Geo | None: ...
+
+    async def get_conditions(self, geo: Geo, approximate: bool = False) -> Weather: ...
+
+    async def get_forecast(
+        self, geo: Geo, delta: ForecastDelta, longs: int
+    ) -> Forecast | ColumnarForecast | None: ...
+
+    async def get_forecast_json(
+        self, geo: Geo, delta: ForecastDelta, longs: int, compact: bool = False
+    ) -> bytes | None:
+        forecast = await self.get_forecast(geo, delta, longs)
+        if forecast is None:
+            return
+        if compact:
+            return forecast.compact_json().encode("utf-8")
+        return forecast.model_dump_json().encode("utf-8")
+
+    async def close(self):
+        """
+        Releases resources held by provider, e.g. connection pools.
+        """
+
+    def __hash__(self):
+        return hash(self.__class__.__name__)
+
+
+class AsyncAccuWeather(AccuWeatherBase, AsyncProvider):
+    def __init__(self, api_key: str | None = None, domain: str | None = None):
+        super().__init__(api_key, domain)
+        connect_timeout, read_timeout = self._timeout
+        pool_size = int(os.getenv("ACCUWEATHER_POOL_SIZE", 100))
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            ),
+        )
+        self._keys = AsyncKeyPool(cache_async._r, self._api_keys)
+        self._breaker = CircuitBreaker()
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def _get(self, url: str, api_key: str, **params) -> httpx.Response:
+        if not await async_governor.acquire():
+            raise UpstreamThrottledError("AccuWeather api call limit is reached")
+        with self._upstream_call():
+            try:
+                response = await self._client.get(
+                    url, params=self._params(api_key, **params)
+                )
+            except httpx.TransportError:
+                self._breaker.record_failure()
+                raise
+            self._record_response(response)
+        return response
+
+    async def _request(self, url: str, **params):
+        # same policy as the sync provider
+        retry = 0
+        while (api_key := await self._keys.choose()) is not None:
+            try:
+                response = await self._get(url, api_key, **params)
+            except httpx.TransportError:
+                if retry >= self._retries:
+                    raise
+            else:
+                if self._is_api_key_expired(response):
+                    await self._keys.exhaust(api_key)
+                    continue
+                await self._keys.record(api_key)
+                if response.status_code not in _RETRY_STATUSES or (
+                    retry >= self._retries
+                ):
+                    self._check_response(response.status_code)
+                    return json.loads(response.text)
+            await asyncio.sleep(_retry_backoff(retry))
+            retry += 1
+        raise ApiKeyExpiredError("Обновите AccuWeather API ключ в .env файле")
+
+    @async_cached(
+        soft_ttl=_GEO_SOFT_TTL, hard_ttl=_GEO_HARD_TTL, call_secs=_UPSTREAM_CALL_SECS
+    )
+    async def _get_geo(
+        self,
+        search_string: str | None = None,
+        longitude: float | None = None,
+        latitude: float | None = None,
+    ):
+        if search_string is None and longitude is None and latitude is None:
+            return
+        baseurl, query = self._geo_url(search_string, longitude, latitude)
+        return await self._request(baseurl, q=query) or None
+
+    async def get_geo(
+        self,
+        search_string: str | None = None,
+        longitude: float | None = None,
+        latitude: float | None = None,
+    ) -> Geo | None:
+        search_string, longitude, latitude = self._normalize_geo_args(
+            search_string, longitude, latitude
+        )
+        if search_string is None and longitude is None:
+            return
+        if geo := self._gazetteer_geo(search_string):
+            return geo
+        if search_string is None and (
+            geo := await async_geo_index.nearest(longitude, latitude)
+        ):
+            return Geo.model_validate_json(geo)
+        query = geo_query(search_string, longitude, latitude)
+        known, geo = await async_geo_index.lookup(query)
+        if known:
+            return None if geo is None else Geo.model_validate_json(geo)
+        data = await self._get_geo(search_string, longitude, latitude)
+        geo = self._parse_geo(data, search_string)
+        await async_geo_index.remember(
+            query, None if geo is None else geo.model_dump_json().encode()
+        )
+        return geo
+
+    @async_cached(
+        soft_ttl=_CONDITIONS_SOFT_TTL,
+        hard_ttl=_CONDITIONS_HARD_TTL,
+        fallback_ttl=_CONDITIONS_FALLBACK_TTL,
+        call_secs=_UPSTREAM_CALL_SECS,
+    )
+    async def _get_conditions(self, geo: Geo):
+        return await self._request(self._conditions_url(geo), details="true")
+
+    async def get_conditions(self, geo: Geo, approximate: bool = False) -> Weather:
+        if approximate and await self._get_conditions.cached_output(self, geo) is None:
+            for longs in _FORECAST_LONGS[ForecastDelta.hour]:
+                data = await self._get_forecast.cached_output(
+                    self, geo, ForecastDelta.hour, longs
+                )
+                if data and (weather := self._approximate_conditions(data, geo)):
+                    return weather
+        with track_fallbacks() as fallbacks:
+            data = await self._get_conditions(geo)
+        weather = self._parse_conditions(data, geo)
+        weather.stale = bool(fallbacks)
+        return weather
+
+    @async_cached(
+        soft_ttl=_FORECAST_SOFT_TTL,
+        hard_ttl=_FORECAST_HARD_TTL,
+        fallback_ttl=_FORECAST_FALLBACK_TTL,
+        call_secs=_UPSTREAM_CALL_SECS,
+    )
+    async def _get_forecast(self, geo: Geo, delta: ForecastDelta, longs: int):
+        return await self._request(
+            self._forecast_url(geo, delta, longs), details="true"
+        )
+
+    async def _forecast_data(self, geo: Geo, delta: ForecastDelta, longs: int):
+        for period in (longs, *self._longer_forecasts(delta, longs)):
+            data = await self._get_forecast.cached_output(self, geo, delta, period)
+            if data is not None:
+                return self._cut_forecast(data, delta, longs)
+        return await self._get_forecast(geo, delta, longs)
+
+    async def get_forecast(
+        self, geo: Geo, delta: ForecastDelta, longs: int
+    ) -> ColumnarForecast | None:
+        with track_fallbacks() as fallbacks:
+            data = await self._forecast_data(geo, delta, longs)
+        forecast = self._parse_forecast(data, geo, delta)
+        if forecast is not None:
+            forecast.stale = bool(fallbacks)
+        return forecast
+
+    @async_cached(
+        soft_ttl=_RENDERED_FORECAST_TTL, serializer=RAW, call_secs=_RENDER_CALL_SECS
+    )
+    async def get_forecast_json(
+        self, geo: Geo, delta: ForecastDelta, longs: int, compact: bool = False
+    ) -> bytes | None:
+        return await super().get_forecast_json(geo, delta, longs, compact)
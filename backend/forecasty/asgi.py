@@ -0,0 +1,24 @@
+if __name__ == "__main__":
+    import logging
+    import forecasty
+    import multiprocessing
+
+    from forecasty.wsgi import WORKER_TIMEOUT, WSGIApplication, purge_stale_cache
+
+    logging.basicConfig(level=logging.INFO)
+
+    SERVER_PORT = 5001
+    # Event loop keeps plenty of upstream calls in flight, so there's no need
+    # in more than one worker per core
+    WORKERS = multiprocessing.cpu_count()
+
+    WSGIApplication(
+        forecasty.make_asgi_app(),
+        {
+            "bind": f"0.0.0.0:{SERVER_PORT}",
+            "workers": WORKERS,
+            "worker_class": "uvicorn.workers.UvicornWorker",
+            "timeout": WORKER_TIMEOUT,
+            "on_starting": purge_stale_cache,
+        },
+    ).run()
@@ -0,0 +1,90 @@
+import os
+import time
+import logging
+import threading
+import contextlib
+
+logger = logging.getLogger(__name__)
+
+# Consecutive failures which open the breaker and how long it stays open
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", 5))
+BREAKER_RESET_SECS = float(os.getenv("BREAKER_RESET_SECS", 30))
+
+
+class CircuitBreaker:
+    """
+    Per-worker circuit breaker of upstream calls. After `max_failures`
+    consecutive failures (timeouts, 5xx) calls are rejected right away for
+    `reset_secs`, then a single trial call is let through: its success closes
+    the breaker, its failure opens it again. Trial which ends up without
+    either, e.g. being throttled, lets the next call try instead.
+    """
+
+    def __init__(
+        self,
+        max_failures: int = BREAKER_FAILURES,
+        reset_secs: float = BREAKER_RESET_SECS,
+    ):
+        self._max_failures = max_failures
+        self._reset_secs = reset_secs
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._trial or time.monotonic() - self._opened_at >= self._reset_secs:
+                return "half-open"
+            return "open"
+
+    def _take(self) -> tuple[bool, bool]:
+        # whether the call is allowed and whether it's the trial one
+        with self._lock:
+            if self._opened_at is None:
+                return True, False
+            if self._trial or time.monotonic() - self._opened_at < self._reset_secs:
+                return False, False
+            self._trial = True
+            return True, True
+
+    def allow(self) -> bool:
+        return self._take()[0]
+
+    @contextlib.contextmanager
+    def attempt(self):
+        """
+        Block of a single upstream call, yields whether it's allowed. The
+        call's outcome is recorded within the block; trial call which hasn't
+        recorded it is released on exit.
+        """
+
+        allowed, trial = self._take()
+        try:
+            yield allowed
+        finally:
+            if trial:
+                with self._lock:
+                    self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Upstream has recovered, closing circuit breaker")
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self._max_failures:
+                if self._opened_at is None:
+                    logger.warning(
+                        f"Opening circuit breaker after {self._failures} failures"
+                    )
+                self._opened_at = time.monotonic()
+            self._trial = False
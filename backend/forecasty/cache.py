@@ -1,54 +1,298 @@
 import os
 import json
+import time
+import zlib
 import redis
+import inspect
 import hashlib
 import logging
+import functools
+import threading
+import contextlib
 
+from enum import Enum
+from typing import Callable, NamedTuple
+from contextvars import ContextVar
+from collections import Counter, OrderedDict
 from pydantic import BaseModel
+from .keypool import describe_error, log_exception, redact
 from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
 
 class _FuncCacheDump(BaseModel):
+    """
+    Legacy format of function cache entry: json-encoded output wrapped into
+    another json string. Such entries are purged, the format is only kept for
+    comparison in benchmarks.
+    """
+
     timestamp: int
     output: str
 
 
+class FuncCacheEntry(NamedTuple):
+    timestamp: int
+    output: bytes  # json-encoded function output
+    # When the newest of cached outputs the output is made of was cached and
+    # when the first of them becomes stale, if it's made of any
+    modified: int | None = None
+    stale_at: int | None = None
+
+    def freshness(self, soft_ttl: int) -> tuple[int, int]:
+        """
+        When the output was cached and when it becomes stale. Output made of
+        other cached outputs is as fresh as they are.
+        """
+
+        stale_at = self.timestamp + soft_ttl
+        if self.stale_at is None:
+            return self.timestamp, stale_at
+        return self.modified, min(self.stale_at, stale_at)
+
+
+# Codecs of the `output` field of function cache entries
+_CODEC_JSON = b"json"
+_CODEC_JSON_ZLIB = b"json+zlib"
+
+
+# Bump whenever the canonical argument encoding below changes, so keys written
+# by an older serializer are never confused with the new ones.
+_KEY_VERSION = 2
+
+
+def _canonical(value):
+    """
+    Converts function argument into a json-compatible value which doesn't
+    depend on the interpreter process (unlike builtin salted `hash()`).
+    """
+
+    if isinstance(value, Enum):
+        return {"enum": type(value).__qualname__, "value": _canonical(value.value)}
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, float):
+        # repr is the shortest string which round-trips to the same float
+        return {"float": repr(value + 0.0)}  # + 0.0 turns -0.0 into 0.0
+    if isinstance(value, BaseModel):
+        return {
+            "model": type(value).__qualname__,
+            "fields": _canonical(value.model_dump()),
+        }
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    raise TypeError(f"Can't build cache key from {type(value).__qualname__} value")
+
+
+@functools.cache
+def _signature(func) -> inspect.Signature:
+    return inspect.signature(func)
+
+
+def serialize_func_args(arguments: dict) -> bytes:
+    """
+    Serializes bound function arguments into canonical bytes.
+    """
+
+    return json.dumps(
+        [_KEY_VERSION, _canonical(arguments)],
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def func_key(func, args: tuple, kwargs: dict) -> str:
+    """
+    Generates unique function key to cache it in this format:
+    func:`function-human-readable-name`:v`key-version`:`function-arguments-hash`
+
+    Arguments are bound to the function signature first, so `f(1, b=2)` and
+    `f(a=1, b=2)` are equal. Methods are named after `cache_namespace` of their
+    instance (class name by default) and `self` isn't hashed: providers don't
+    hold any state which affects the output. So sync and async variants of
+    the same provider share their entries.
+    """
+
+    bound = _signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)
+    name = func.__qualname__
+    if "self" in arguments:
+        instance = arguments.pop("self")
+        namespace = getattr(instance, "cache_namespace", type(instance).__qualname__)
+        name = f"{namespace}.{func.__name__}"
+    args_hash = hashlib.md5()  # md5's greatly faster than sha256, so use it
+    args_hash.update(serialize_func_args(arguments))
+    return f"func:{name}:v{_KEY_VERSION}:{args_hash.hexdigest()}"
+
+
+def encode_func_entry(entry: FuncCacheEntry, compress_min_bytes: int = 0) -> dict:
+    """
+    Encodes function cache entry into fields of redis hash. Outputs larger
+    than `compress_min_bytes` are zlib-compressed (0 disables compression).
+    """
+
+    codec, output = _CODEC_JSON, entry.output
+    if 0 < compress_min_bytes <= len(output):
+        codec, output = _CODEC_JSON_ZLIB, zlib.compress(output, 1)
+    fields = {"timestamp": entry.timestamp, "codec": codec, "output": output}
+    if entry.stale_at is not None:
+        fields.update(modified=entry.modified, stale_at=entry.stale_at)
+    return fields
+
+
+# Fields of redis hash `decode_func_entry` takes in this order
+_FUNC_ENTRY_FIELDS = ("timestamp", "codec", "output", "modified", "stale_at")
+
+
+def decode_func_entry(
+    timestamp, codec, output, modified=None, stale_at=None
+) -> FuncCacheEntry | None:
+    if timestamp is None:
+        return None
+    if codec == _CODEC_JSON_ZLIB:
+        output = zlib.decompress(output)
+    if stale_at is None:
+        return FuncCacheEntry(int(timestamp), output)
+    return FuncCacheEntry(int(timestamp), output, int(modified), int(stale_at))
+
+
+def is_stale_func_key(key: str) -> bool:
+    """
+    Whether function key is of older format, e.g. legacy
+    `func:<name>:<salted hash>` or of older `_KEY_VERSION`. Such keys are
+    never looked up again.
+    """
+
+    parts = key.split(":")
+    return len(parts) != 4 or parts[2] != f"v{_KEY_VERSION}"
+
+
 class MemCache:
-    def __init__(self, redis_connection):
+    """
+    Stores function outputs as redis hashes with `timestamp`, `codec` and
+    `output` fields, so the output is encoded only once. Outputs larger than
+    `compress_min_bytes` are zlib-compressed (0 disables compression).
+    Redis connection must not decode responses.
+    """
+
+    def __init__(self, redis_connection, compress_min_bytes: int = 0):
         self._r = redis_connection
+        self._compress_min_bytes = compress_min_bytes
+
+    def func_key(self, func, args: tuple, kwargs: dict) -> str:
+        return func_key(func, args, kwargs)
+
+    def cache_func(self, key: str, entry: FuncCacheEntry, ttl: int | None = None):
+        with self._r.pipeline() as pipe:
+            pipe.delete(key)  # it could be an entry of other type
+            pipe.hset(key, mapping=encode_func_entry(entry, self._compress_min_bytes))
+            if ttl is not None:
+                pipe.expire(key, ttl)
+            pipe.execute()
+
+    def get_func(self, key: str) -> FuncCacheEntry | None:
+        try:
+            fields = self._r.hmget(key, *_FUNC_ENTRY_FIELDS)
+        except redis.exceptions.ResponseError:
+            # not a hash, so it's no entry of the current format
+            return None
+        return decode_func_entry(*fields)
 
-    def _hash_func_args(self, args: tuple, kwargs: dict) -> str:
-        args_hash = hashlib.md5()  # md5's greatly faster than sha256, so use it
-        args_hash.update(str(hash(args)).encode("utf-8"))
-        args_hash.update(str(hash(json.dumps(kwargs))).encode("utf-8"))
-        return args_hash.hexdigest()
+    def purge_stale_funcs(self, batch: int = 500) -> int:
+        """
+        Deletes entries under keys of older formats. Old entries could be
+        written without expiration, so they'd stay in redis forever. Returns
+        their count.
+        """
 
-    def func_key(self, func, args: tuple, kwargs: dict):
+        purged = 0
+        keys = self._r.scan_iter("func:*", count=batch)
+        stale = [key for key in keys if is_stale_func_key(key.decode("utf-8"))]
+        for i in range(0, len(stale), batch):
+            purged += self._r.unlink(*stale[i : i + batch])
+        return purged
+
+    def publish_outcome(self, key: str, error: str | None, ttl: int):
         """
-        Generates unique function key to cache it in this format:
-        func:`function-human-readable-name`:`function-hash`(`function-arguments-hash`)
+        Publishes for `ttl` seconds that the function call for given key has
+        failed with `error` or has returned None, neither of which is cached.
         """
 
-        return f"func:{func.__qualname__}:{self._hash_func_args(args, kwargs)}"
+        outcome = "none" if error is None else f"error:{error}"
+        self._r.set(f"outcome:{key}", outcome, ex=ttl)
 
-    def cache_func(self, key: str, timestamp: int, output: str):
-        self._r.set(
-            key, _FuncCacheDump(timestamp=timestamp, output=output).model_dump_json()
-        )
+    def get_outcome(self, key: str) -> str | None:
+        """
+        Returns "none" or "error:<error>" published by `publish_outcome`.
+        """
 
-    def get_func(self, key: str) -> _FuncCacheDump | None:
-        dump = self._r.get(key)
-        if dump is None:
-            return None
-        return _FuncCacheDump.model_validate_json(dump)
+        outcome = self._r.get(f"outcome:{key}")
+        return None if outcome is None else outcome.decode("utf-8")
 
     def erase_func(self, key):
         self._r.delete(key)
 
+    def lock_func(self, key: str, ttl: int) -> redis.lock.Lock:
+        """
+        Returns lease which is held by the only worker calling the function for
+        given key. Lease expires after `ttl` seconds if its holder dies. It's
+        not bound to a thread, so it can be released by background refresh.
+        """
+
+        return self._r.lock(f"lock:{key}", timeout=ttl, thread_local=False)
+
+
+class LocalCache:
+    """
+    Per-worker LRU cache in front of redis. It's bounded both by number of
+    entries and by total size of their serialized outputs. Outputs are stored
+    already decoded, so callers must treat them as read-only.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[int, object, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_entries > 0 and self._max_bytes > 0
+
+    def get(self, key: str) -> tuple[int, object] | None:
+        with self._lock:
+            if (entry := self._entries.get(key)) is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def put(self, key: str, timestamp: int, output, size: int):
+        if not self.enabled or size > self._max_bytes:
+            return
+        with self._lock:
+            if (old := self._entries.pop(key, None)) is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (timestamp, output, size)
+            self._bytes += size
+            while (
+                len(self._entries) > self._max_entries or self._bytes > self._max_bytes
+            ):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def erase(self, key: str):
+        with self._lock:
+            if (old := self._entries.pop(key, None)) is not None:
+                self._bytes -= old[2]
+
 
-def get_redis_connection_params():
+def get_redis_connection_params(decode_responses: bool = True):
     REDIS_HOST_FALLBACK = "redis"
     REDIS_PORT_FALLBACK = 6379
     REDIS_PASSWORD_FALLBACK = "toor"
@@ -56,36 +300,431 @@ def get_redis_connection_params():
     REDIS_HOST = os.getenv("REDIS_HOST", REDIS_HOST_FALLBACK)
     REDIS_PORT = os.getenv("REDIS_PORT", REDIS_PORT_FALLBACK)
     REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", REDIS_PASSWORD_FALLBACK)
+    REDIS_DB = int(os.getenv("REDIS_DB", 0))
 
     return {
         "host": REDIS_HOST,
         "port": REDIS_PORT,
         "password": REDIS_PASSWORD,
-        "decode_responses": True,
+        "db": REDIS_DB,
+        "decode_responses": decode_responses,
     }
 
 
-_r = redis.Redis(**get_redis_connection_params())
+# Cached outputs can be compressed, so they're read as raw bytes
+_r = redis.Redis(**get_redis_connection_params(decode_responses=False))
 
-_memcache = MemCache(_r)
+_memcache = MemCache(
+    _r, compress_min_bytes=int(os.getenv("CACHE_COMPRESS_MIN_BYTES", 4096))
+)
+
+_local_cache = LocalCache(
+    max_entries=int(os.getenv("LOCAL_CACHE_ENTRIES", 1024)),
+    max_bytes=int(os.getenv("LOCAL_CACHE_BYTES", 64 * 1024 * 1024)),
+)
+
+# Per-worker hit/miss counters of both cache tiers
+_stats = Counter()
+
+# Set while function is called to refresh its output rather than to serve a
+# request, so upstream calls made by it may be deprioritized
+_background = ContextVar("cache_background", default=False)
+# Keys of fallback outputs returned within `track_fallbacks` block
+_fallbacks: ContextVar[list | None] = ContextVar("cache_fallbacks", default=None)
+# Outputs returned within `track_freshness` block
+_freshness: ContextVar["Freshness | None"] = ContextVar("cache_freshness", default=None)
 
 _TRIGGER_CALL_SECS = 2 * 3600  # two hours
+_CALL_SECS = 30  # default upper bound of a single function call
+_CALL_POLL_SECS = 0.05
+# How long failures and None outputs, which aren't cached, are given to those
+# waiting for the call instead
+_CALL_OUTCOME_SECS = 5
+# Outcome of the call by other worker isn't known yet
+_PENDING = object()
+
+
+class CallFailedError(Exception):
+    """
+    The function has just failed being called by other worker and there's no
+    fallback to return instead.
+    """
+
+
+class CallTimeoutError(Exception):
+    """
+    Output of the function called by other worker hasn't been cached in time
+    and there's no fallback to return instead.
+    """
+
+
+def _now_timestamp() -> int:
+    return int(round(datetime.now(timezone.utc).timestamp()))
+
+
+class Serializer(NamedTuple):
+    dumps: Callable[[object], bytes]
+    loads: Callable[[bytes], object]
+
+
+# Function output is json-compatible value
+JSON = Serializer(
+    dumps=lambda output: json.dumps(output, ensure_ascii=False).encode("utf-8"),
+    loads=json.loads,
+)
+
+# Function output is already encoded, e.g. rendered response body
+RAW = Serializer(dumps=bytes, loads=bytes)
+
+
+def stats() -> dict[str, int]:
+    return {
+        "local_hits": _stats["local_hits"],
+        "local_misses": _stats["local_misses"],
+        "redis_hits": _stats["redis_hits"],
+        "redis_stale_hits": _stats["redis_stale_hits"],
+        "redis_misses": _stats["redis_misses"],
+        "fallbacks": _stats["fallbacks"],
+    }
+
 
+def in_background() -> bool:
+    """
+    Tells whether current call refreshes cached output in background.
+    """
 
-def cached(func):
+    return _background.get()
+
+
+@contextlib.contextmanager
+def track_fallbacks():
+    """
+    Collects keys of fallback outputs (see `cached`) returned by cached
+    functions within the block, including nested calls. The collected list is
+    also reported to enclosing block.
+    """
+
+    fallbacks = []
+    token = _fallbacks.set(fallbacks)
+    try:
+        yield fallbacks
+    finally:
+        _fallbacks.reset(token)
+        if fallbacks and (outer := _fallbacks.get()) is not None:
+            outer.extend(fallbacks)
+
+
+def _served_fallback(key: str):
+    _stats["fallbacks"] += 1
+    if (fallbacks := _fallbacks.get()) is not None:
+        fallbacks.append(key)
+
+
+class Freshness(list):
+    """
+    Timestamps of cached outputs and when they become stale, as pairs.
+    """
+
+    @property
+    def timestamp(self) -> int | None:
+        """
+        When the newest of the outputs was cached.
+        """
+
+        return max((timestamp for timestamp, _ in self), default=None)
+
+    @property
+    def stale_at(self) -> int | None:
+        """
+        When the first of the outputs becomes stale.
+        """
+
+        return min((stale for _, stale in self), default=None)
+
+    def max_age(self) -> int:
+        """
+        Seconds all the outputs stay fresh for.
+        """
+
+        if not self:
+            return 0
+        return max(0, self.stale_at - _now_timestamp())
+
+
+@contextlib.contextmanager
+def track_freshness():
+    """
+    Collects `Freshness` of outputs returned by cached functions within the
+    block, including nested calls. Like `track_fallbacks`, it's also reported
+    to enclosing block.
+    """
+
+    freshness = Freshness()
+    token = _freshness.set(freshness)
+    try:
+        yield freshness
+    finally:
+        _freshness.reset(token)
+        if freshness and (outer := _freshness.get()) is not None:
+            outer.extend(freshness)
+
+
+def _served_output(entry: FuncCacheEntry, soft_ttl: int):
+    if (freshness := _freshness.get()) is not None:
+        freshness.append(entry.freshness(soft_ttl))
+
+
+def _release(lock: redis.lock.Lock):
+    try:
+        lock.release()
+    except redis.exceptions.LockError:
+        # lease has expired and could be taken by someone else already
+        logger.warning(f"Lost {lock.name} before release")
+
+
+def cached(
+    func=None,
+    *,
+    soft_ttl: int = _TRIGGER_CALL_SECS,
+    hard_ttl: int | None = None,
+    fallback_ttl: int = 0,
+    local: bool = True,
+    serializer: Serializer = JSON,
+    call_secs: int = _CALL_SECS,
+):
+    """
+    Caches function output in redis. Output younger than `soft_ttl` seconds is
+    returned as is. Older output is stale: it's still returned immediately,
+    while a single background call (across all workers) refreshes it. After
+    `hard_ttl` seconds redis expires the entry by itself. By default
+    `hard_ttl` equals `soft_ttl`, i.e. stale output is never served.
+
+    Output is kept `fallback_ttl` seconds more to be returned if the call
+    fails, e.g. when upstream is down. Such fallbacks are reported to
+    `track_fallbacks` blocks, and outputs of functions which got them aren't
+    cached. Timestamps of all returned outputs and when they become stale are
+    reported to `track_freshness` blocks. Outputs made of other cached outputs,
+    e.g. rendered ones, report the freshness of the latter.
+
+    Calls are single-flight: on a miss only the worker holding redis lease
+    calls the function, others poll redis for its output. Failures and None
+    outputs are shortly published for them too, so they don't repeat the
+    call. `call_secs` is an
+    upper bound of the call: the lease is held that long at most, and others
+    wait that long for the output before returning fallback or raising
+    `CallTimeoutError`, rather than calling the function all at once.
+
+    Unless `local` is False, fresh outputs are also kept in per-worker
+    `LocalCache`, so repeated hits don't even go to redis.
+
+    Outputs are encoded with `serializer`, `JSON` by default. None outputs are
+    never cached.
+
+    Can be used both as `@cached` and `@cached(soft_ttl=..., hard_ttl=...)`.
+    Decorated function gets `refresh_ahead(ahead, *args, **kwargs)` which
+    refreshes cached output shortly before it becomes stale, and
+    `cached_output(*args, **kwargs)` which only looks output up.
+    """
+
+    if func is None:
+        return functools.partial(
+            cached,
+            soft_ttl=soft_ttl,
+            hard_ttl=hard_ttl,
+            fallback_ttl=fallback_ttl,
+            local=local,
+            serializer=serializer,
+            call_secs=call_secs,
+        )
+
+    hard_ttl = soft_ttl if hard_ttl is None else hard_ttl
+    if hard_ttl < soft_ttl:
+        raise ValueError("hard_ttl must not be less than soft_ttl")
+
+    local = local and _local_cache.enabled
+
+    def remember(key, dump, output):
+        if local and _now_timestamp() - dump.timestamp <= soft_ttl:
+            # the entry is kept without its encoded output to report freshness
+            entry = (output, dump._replace(output=b""))
+            _local_cache.put(key, dump.timestamp, entry, len(dump.output))
+
+    def load(key, dump):
+        output = serializer.loads(dump.output)
+        remember(key, dump, output)
+        _served_output(dump, soft_ttl)
+        return output
+
+    def call(key, args, kwargs):
+        with track_fallbacks() as fallbacks, track_freshness() as sources:
+            output = func(*args, **kwargs)
+        # output made of fallbacks mustn't outlive them
+        if output is None or fallbacks:
+            return output
+        encoded = serializer.dumps(output)
+        dump = FuncCacheEntry(
+            _now_timestamp(), encoded, sources.timestamp, sources.stale_at
+        )
+        _served_output(dump, soft_ttl)
+        _memcache.cache_func(key, dump, hard_ttl + fallback_ttl)
+        remember(key, dump, output)
+        logger.info(f"Cached {key} output")
+        return output
+
+    def fresh_output(key):
+        if dump := _memcache.get_func(key):
+            if _now_timestamp() - dump.timestamp <= soft_ttl:
+                return dump
+        return None
+
+    def fallback_or_raise(key, error, fallback):
+        if fallback is None:
+            raise error
+        logger.warning(
+            f"Failed to call {key} ({redact(repr(error))}), returning fallback"
+        )
+        _served_fallback(key)
+        _served_output(fallback, soft_ttl)
+        return serializer.loads(fallback.output)
+
+    def call_and_publish(key, args, kwargs, fallback):
+        # failures and None outputs aren't cached, so they're published for
+        # others waiting for the call not to make it as well
+        try:
+            output = call(key, args, kwargs)
+        except Exception as e:
+            _memcache.publish_outcome(key, describe_error(e), _CALL_OUTCOME_SECS)
+            return fallback_or_raise(key, e, fallback)
+        if output is None:
+            _memcache.publish_outcome(key, None, _CALL_OUTCOME_SECS)
+        return output
+
+    def called_output(key, fallback):
+        """
+        Output of the call made by other worker, or `_PENDING`.
+        """
+
+        if dump := fresh_output(key):
+            return load(key, dump)
+        if (outcome := _memcache.get_outcome(key)) is None:
+            return _PENDING
+        if outcome == "none":
+            return None
+        error = outcome.removeprefix("error:")
+        return fallback_or_raise(key, CallFailedError(error), fallback)
+
+    def call_single_flight(key, args, kwargs, fallback=None):
+        lock = _memcache.lock_func(key, call_secs)
+        deadline = time.monotonic() + call_secs
+        while time.monotonic() < deadline:
+            if lock.acquire(blocking=False):
+                try:
+                    # the call could be made between our miss and the lease
+                    if (output := called_output(key, fallback)) is not _PENDING:
+                        return output
+                    return call_and_publish(key, args, kwargs, fallback)
+                finally:
+                    _release(lock)
+            if (output := called_output(key, fallback)) is not _PENDING:
+                logger.info(f"Got {key} output called by other worker")
+                return output
+            time.sleep(_CALL_POLL_SECS)
+        error = CallTimeoutError(f"Timed out waiting for {key} output")
+        return fallback_or_raise(key, error, fallback)
+
+    def refresh(key, args, kwargs, lock):
+        _background.set(True)  # the thread has its own context
+        try:
+            call(key, args, kwargs)
+        except Exception:
+            log_exception(logger, f"Failed to refresh {key} in background")
+        finally:
+            _release(lock)
+
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
         key = _memcache.func_key(func, args, kwargs)
+        if local:
+            entry = _local_cache.get(key)
+            if entry is not None and _now_timestamp() - entry[0] <= soft_ttl:
+                _stats["local_hits"] += 1
+                output, dump = entry[1]
+                _served_output(dump, soft_ttl)
+                return output
+            _stats["local_misses"] += 1
         if dump := _memcache.get_func(key):
-            call_dt = datetime.fromtimestamp(float(dump.timestamp), timezone.utc)
-            current_dt = datetime.now(timezone.utc)
-            delta = current_dt - call_dt
-            if delta.total_seconds() <= _TRIGGER_CALL_SECS:
+            age = _now_timestamp() - dump.timestamp
+            if age <= soft_ttl:
+                _stats["redis_hits"] += 1
                 logger.info(f"Got {key} output from cache")
-                return json.loads(dump.output)
-        output = func(*args, **kwargs)
-        timestamp = int(round(datetime.now(timezone.utc).timestamp()))
-        _memcache.cache_func(key, timestamp, json.dumps(output))
-        logger.info(f"Cached {key} output")
-        return output
+                return load(key, dump)
+            if age <= hard_ttl:
+                _stats["redis_stale_hits"] += 1
+                lock = _memcache.lock_func(key, call_secs)
+                if lock.acquire(blocking=False):
+                    threading.Thread(
+                        target=refresh, args=(key, args, kwargs, lock), daemon=True
+                    ).start()
+                logger.info(f"Got stale {key} output from cache")
+                _served_output(dump, soft_ttl)
+                return serializer.loads(dump.output)
+        _stats["redis_misses"] += 1
+        # output older than hard ttl is only kept as fallback
+        return call_single_flight(key, args, kwargs, fallback=dump)
+
+    def refresh_ahead(ahead: int, *args, **kwargs) -> bool:
+        """
+        Calls the function in advance if its cached output is missing or gets
+        stale within `ahead` seconds. Returns whether it's been called.
+        """
 
+        key = _memcache.func_key(func, args, kwargs)
+        if dump := _memcache.get_func(key):
+            if _now_timestamp() - dump.timestamp < soft_ttl - ahead:
+                return False
+        lock = _memcache.lock_func(key, call_secs)
+        if not lock.acquire(blocking=False):
+            return False  # someone is calling it right now
+        token = _background.set(True)
+        try:
+            call(key, args, kwargs)
+        finally:
+            _background.reset(token)
+            _release(lock)
+        return True
+
+    def cached_output(*args, **kwargs):
+        """
+        Returns fresh cached output without calling the function, if any.
+        """
+
+        key = _memcache.func_key(func, args, kwargs)
+        if local:
+            entry = _local_cache.get(key)
+            if entry is not None and _now_timestamp() - entry[0] <= soft_ttl:
+                output, dump = entry[1]
+                _served_output(dump, soft_ttl)
+                return output
+        if dump := fresh_output(key):
+            return load(key, dump)
+        return None
+
+    wrapper.refresh_ahead = refresh_ahead
+    wrapper.cached_output = cached_output
     return wrapper
+
+
+def purge_stale_funcs() -> int:
+    """
+    Deletes function cache entries of older formats, see
+    `MemCache.purge_stale_funcs`.
+    """
+
+    purged = _memcache.purge_stale_funcs()
+    logger.info(f"Purged {purged} stale cache entries")
+    return purged
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    purge_stale_funcs()
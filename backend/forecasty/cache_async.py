@@ -0,0 +1,258 @@
+import os
+import redis
+import asyncio
+import logging
+import functools
+import redis.asyncio as aioredis
+
+from . import cache
+from .keypool import describe_error, log_exception, redact
+from .cache import (
+    JSON,
+    FuncCacheEntry,
+    Serializer,
+    func_key,
+    encode_func_entry,
+    decode_func_entry,
+    get_redis_connection_params,
+    _FUNC_ENTRY_FIELDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMemCache:
+    """
+    `MemCache` over asyncio redis connection. Keys and entries have the same
+    format, so sync and async workers share them.
+    """
+
+    def __init__(self, redis_connection, compress_min_bytes: int = 0):
+        self._r = redis_connection
+        self._compress_min_bytes = compress_min_bytes
+
+    def func_key(self, func, args: tuple, kwargs: dict) -> str:
+        return func_key(func, args, kwargs)
+
+    async def cache_func(self, key: str, entry: FuncCacheEntry, ttl: int | None = None):
+        async with self._r.pipeline() as pipe:
+            pipe.delete(key)  # it could be an entry of other type
+            pipe.hset(key, mapping=encode_func_entry(entry, self._compress_min_bytes))
+            if ttl is not None:
+                pipe.expire(key, ttl)
+            await pipe.execute()
+
+    async def get_func(self, key: str) -> FuncCacheEntry | None:
+        try:
+            fields = await self._r.hmget(key, *_FUNC_ENTRY_FIELDS)
+        except redis.exceptions.ResponseError:
+            # not a hash, so it's no entry of the current format
+            return None
+        return decode_func_entry(*fields)
+
+    async def publish_outcome(self, key: str, error: str | None, ttl: int):
+        outcome = "none" if error is None else f"error:{error}"
+        await self._r.set(f"outcome:{key}", outcome, ex=ttl)
+
+    async def get_outcome(self, key: str) -> str | None:
+        outcome = await self._r.get(f"outcome:{key}")
+        return None if outcome is None else outcome.decode("utf-8")
+
+    async def erase_func(self, key):
+        await self._r.delete(key)
+
+    def lock_func(self, key: str, ttl: int) -> aioredis.lock.Lock:
+        return self._r.lock(f"lock:{key}", timeout=ttl, thread_local=False)
+
+
+_r = aioredis.Redis(**get_redis_connection_params(decode_responses=False))
+
+_memcache = AsyncMemCache(
+    _r, compress_min_bytes=int(os.getenv("CACHE_COMPRESS_MIN_BYTES", 4096))
+)
+
+# Background refreshes are referenced until they're done, otherwise event loop
+# could garbage-collect them halfway
+_refreshes: set[asyncio.Task] = set()
+
+
+async def _release(lock: aioredis.lock.Lock):
+    try:
+        await lock.release()
+    except redis.exceptions.LockError:
+        logger.warning(f"Lost {lock.name} before release")
+
+
+def async_cached(
+    func=None,
+    *,
+    soft_ttl: int = cache._TRIGGER_CALL_SECS,
+    hard_ttl: int | None = None,
+    fallback_ttl: int = 0,
+    local: bool = True,
+    serializer: Serializer = JSON,
+    call_secs: int = cache._CALL_SECS,
+):
+    """
+    Coroutine version of `cache.cached` with the same semantics and options.
+    It shares redis entries, per-worker `LocalCache` and counters with it.
+    Decorated coroutine has `cached_output` counterpart too.
+    """
+
+    if func is None:
+        return functools.partial(
+            async_cached,
+            soft_ttl=soft_ttl,
+            hard_ttl=hard_ttl,
+            fallback_ttl=fallback_ttl,
+            local=local,
+            serializer=serializer,
+            call_secs=call_secs,
+        )
+
+    hard_ttl = soft_ttl if hard_ttl is None else hard_ttl
+    if hard_ttl < soft_ttl:
+        raise ValueError("hard_ttl must not be less than soft_ttl")
+
+    local = local and cache._local_cache.enabled
+
+    def remember(key, dump, output):
+        if local and cache._now_timestamp() - dump.timestamp <= soft_ttl:
+            entry = (output, dump._replace(output=b""))
+            cache._local_cache.put(key, dump.timestamp, entry, len(dump.output))
+
+    def load(key, dump):
+        output = serializer.loads(dump.output)
+        remember(key, dump, output)
+        cache._served_output(dump, soft_ttl)
+        return output
+
+    async def call(key, args, kwargs):
+        with cache.track_fallbacks() as fallbacks, cache.track_freshness() as sources:
+            output = await func(*args, **kwargs)
+        # output made of fallbacks mustn't outlive them
+        if output is None or fallbacks:
+            return output
+        encoded = serializer.dumps(output)
+        dump = FuncCacheEntry(
+            cache._now_timestamp(), encoded, sources.timestamp, sources.stale_at
+        )
+        cache._served_output(dump, soft_ttl)
+        await _memcache.cache_func(key, dump, hard_ttl + fallback_ttl)
+        remember(key, dump, output)
+        logger.info(f"Cached {key} output")
+        return output
+
+    async def fresh_output(key):
+        if dump := await _memcache.get_func(key):
+            if cache._now_timestamp() - dump.timestamp <= soft_ttl:
+                return dump
+        return None
+
+    def fallback_or_raise(key, error, fallback):
+        if fallback is None:
+            raise error
+        logger.warning(
+            f"Failed to call {key} ({redact(repr(error))}), returning fallback"
+        )
+        cache._served_fallback(key)
+        cache._served_output(fallback, soft_ttl)
+        return serializer.loads(fallback.output)
+
+    async def call_and_publish(key, args, kwargs, fallback):
+        try:
+            output = await call(key, args, kwargs)
+        except Exception as e:
+            await _memcache.publish_outcome(
+                key, describe_error(e), cache._CALL_OUTCOME_SECS
+            )
+            return fallback_or_raise(key, e, fallback)
+        if output is None:
+            await _memcache.publish_outcome(key, None, cache._CALL_OUTCOME_SECS)
+        return output
+
+    async def called_output(key, fallback):
+        if dump := await fresh_output(key):
+            return load(key, dump)
+        if (outcome := await _memcache.get_outcome(key)) is None:
+            return cache._PENDING
+        if outcome == "none":
+            return None
+        error = outcome.removeprefix("error:")
+        return fallback_or_raise(key, cache.CallFailedError(error), fallback)
+
+    async def call_single_flight(key, args, kwargs, fallback=None):
+        lock = _memcache.lock_func(key, call_secs)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + call_secs
+        while loop.time() < deadline:
+            if await lock.acquire(blocking=False):
+                try:
+                    # the call could be made between our miss and the lease
+                    output = await called_output(key, fallback)
+                    if output is not cache._PENDING:
+                        return output
+                    return await call_and_publish(key, args, kwargs, fallback)
+                finally:
+                    await _release(lock)
+            if (output := await called_output(key, fallback)) is not cache._PENDING:
+                logger.info(f"Got {key} output called by other worker")
+                return output
+            await asyncio.sleep(cache._CALL_POLL_SECS)
+        error = cache.CallTimeoutError(f"Timed out waiting for {key} output")
+        return fallback_or_raise(key, error, fallback)
+
+    async def refresh(key, args, kwargs, lock):
+        cache._background.set(True)  # the task runs in a copy of context
+        try:
+            await call(key, args, kwargs)
+        except Exception:
+            log_exception(logger, f"Failed to refresh {key} in background")
+        finally:
+            await _release(lock)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        key = _memcache.func_key(func, args, kwargs)
+        if local:
+            entry = cache._local_cache.get(key)
+            if entry is not None and cache._now_timestamp() - entry[0] <= soft_ttl:
+                cache._stats["local_hits"] += 1
+                output, dump = entry[1]
+                cache._served_output(dump, soft_ttl)
+                return output
+            cache._stats["local_misses"] += 1
+        if dump := await _memcache.get_func(key):
+            age = cache._now_timestamp() - dump.timestamp
+            if age <= soft_ttl:
+                cache._stats["redis_hits"] += 1
+                logger.info(f"Got {key} output from cache")
+                return load(key, dump)
+            if age <= hard_ttl:
+                cache._stats["redis_stale_hits"] += 1
+                lock = _memcache.lock_func(key, call_secs)
+                if await lock.acquire(blocking=False):
+                    task = asyncio.create_task(refresh(key, args, kwargs, lock))
+                    _refreshes.add(task)
+                    task.add_done_callback(_refreshes.discard)
+                logger.info(f"Got stale {key} output from cache")
+                cache._served_output(dump, soft_ttl)
+                return serializer.loads(dump.output)
+        cache._stats["redis_misses"] += 1
+        # output older than hard ttl is only kept as fallback
+        return await call_single_flight(key, args, kwargs, fallback=dump)
+
+    async def cached_output(*args, **kwargs):
+        key = _memcache.func_key(func, args, kwargs)
+        if local:
+            entry = cache._local_cache.get(key)
+            if entry is not None and cache._now_timestamp() - entry[0] <= soft_ttl:
+                output, dump = entry[1]
+                cache._served_output(dump, soft_ttl)
+                return output
+        if dump := await fresh_output(key):
+            return load(key, dump)
+        return None
+
+    wrapper.cached_output = cached_output
+    return wrapper
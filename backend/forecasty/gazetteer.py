@@ -0,0 +1,170 @@
+import os
+import csv
+import json
+import logging
+
+from array import array
+from bisect import bisect_left
+from typing import Iterable, NamedTuple
+from collections import Counter, defaultdict
+from .geo import geo_index, normalize_search_string
+
+logger = logging.getLogger(__name__)
+
+# Columns of gazetteer csv file, aliases are separated by `|`
+GAZETTEER_COLUMNS = ("key", "name", "longitude", "latitude", "aliases")
+
+
+class GazetteerEntry(NamedTuple):
+    id: str
+    name: str
+    longitude: float
+    latitude: float
+
+
+def _trigrams(string: str) -> set[str]:
+    string = f"  {string} "
+    return {string[i : i + 3] for i in range(len(string) - 2)}
+
+
+class Gazetteer:
+    """
+    Offline index of known cities mapped to AccuWeather location keys.
+    Entries live in parallel arrays; names and aliases are kept sorted for
+    prefix search, with trigram index on top of them for fuzzy completion.
+    It's built once before gunicorn forks, so workers share its memory.
+    """
+
+    def __init__(self, rows: Iterable[tuple[str, str, float, float, list[str]]]):
+        self._ids: list[str] = []
+        self._names: list[str] = []
+        self._longitudes = array("d")
+        self._latitudes = array("d")
+
+        spellings = []
+        for key, name, longitude, latitude, aliases in rows:
+            entry = len(self._ids)
+            self._ids.append(key)
+            self._names.append(name)
+            self._longitudes.append(longitude)
+            self._latitudes.append(latitude)
+            for spelling in {normalize_search_string(s) for s in (name, *aliases)}:
+                spellings.append((spelling, entry))
+        spellings.sort()
+
+        # i-th spelling refers to `_spelling_entries[i]` entry
+        self._spellings = [spelling for spelling, _ in spellings]
+        self._spelling_entries = array("I", (entry for _, entry in spellings))
+
+        trigrams = defaultdict(lambda: array("I"))
+        for i, spelling in enumerate(self._spellings):
+            for trigram in _trigrams(spelling):
+                trigrams[trigram].append(i)
+        self._trigrams = dict(trigrams)
+
+    @classmethod
+    def load(cls, path: str) -> "Gazetteer":
+        with open(path, newline="", encoding="utf-8") as file:
+            rows = [
+                (
+                    row["key"],
+                    row["name"],
+                    float(row["longitude"]),
+                    float(row["latitude"]),
+                    [alias for alias in (row.get("aliases") or "").split("|") if alias],
+                )
+                for row in csv.DictReader(file)
+            ]
+        gazetteer = cls(rows)
+        logger.info(f"Loaded {len(gazetteer)} gazetteer locations from {path}")
+        return gazetteer
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _entry(self, entry: int) -> GazetteerEntry:
+        return GazetteerEntry(
+            id=self._ids[entry],
+            name=self._names[entry],
+            longitude=self._longitudes[entry],
+            latitude=self._latitudes[entry],
+        )
+
+    def lookup(self, search_string: str) -> GazetteerEntry | None:
+        """
+        Finds location by its exact (normalized) name or alias.
+        """
+
+        spelling = normalize_search_string(search_string)
+        i = bisect_left(self._spellings, spelling)
+        if i < len(self._spellings) and self._spellings[i] == spelling:
+            return self._entry(self._spelling_entries[i])
+        return None
+
+    def complete(self, prefix: str, limit: int = 10) -> list[GazetteerEntry]:
+        """
+        Suggests locations whose names start with the prefix, followed by
+        ones sharing most of its trigrams, e.g. misspelled.
+        """
+
+        prefix = normalize_search_string(prefix)
+        if not prefix:
+            return []
+
+        found = {}  # keeps order of insertion
+        i = bisect_left(self._spellings, prefix)
+        while (
+            len(found) < limit
+            and i < len(self._spellings)
+            and self._spellings[i].startswith(prefix)
+        ):
+            found.setdefault(self._spelling_entries[i], None)
+            i += 1
+
+        if len(found) < limit and len(prefix) >= 3:
+            trigrams = _trigrams(prefix)
+            scores = Counter()
+            for trigram in trigrams:
+                scores.update(self._trigrams.get(trigram, ()))
+            for i, score in scores.most_common():
+                if len(found) >= limit or score * 2 < len(trigrams):
+                    break
+                found.setdefault(self._spelling_entries[i], None)
+
+        return [self._entry(entry) for entry in found]
+
+
+def export_geo_index(path: str) -> int:
+    """
+    Writes names resolved so far by `GeoIndex` into gazetteer csv file, so it
+    can be preloaded later. Returns count of written locations.
+    """
+
+    locations = {}
+    aliases = defaultdict(set)
+    for query, geo in geo_index.names():
+        geo = json.loads(geo)
+        locations[geo["id"]] = geo
+        aliases[geo["id"]].add(query)
+
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(GAZETTEER_COLUMNS)
+        for key, geo in locations.items():
+            names = aliases[key] - {normalize_search_string(geo["name"])}
+            writer.writerow(
+                (key, geo["name"], geo["longitude"], geo["latitude"], "|".join(names))
+            )
+    return len(locations)
+
+
+gazetteer = (
+    Gazetteer.load(path) if (path := os.getenv("GAZETTEER_PATH")) else Gazetteer([])
+)
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    print(f"Exported {export_geo_index(sys.argv[1])} locations to {sys.argv[1]}")
@@ -0,0 +1,290 @@
+import os
+import json
+import math
+import time
+import hashlib
+import threading
+import unicodedata
+
+from array import array
+from typing import Iterable
+
+from . import cache, cache_async
+from .cache import LocalCache
+
+# Coordinates are snapped to the grid of this step (~1 km by default), so
+# nearby points share one geoposition lookup
+GEO_SNAP_DEGREES = float(os.getenv("GEO_SNAP_DEGREES", 0.01))
+# Failed lookups (e.g. misspelled names) are retried after this period
+GEO_MISS_TTL = int(os.getenv("GEO_MISS_TTL", 3600))
+# Coordinates this close to an already resolved location are resolved to it
+# without asking provider, 0 disables it
+GEO_NEAREST_KM = float(os.getenv("GEO_NEAREST_KM", 3))
+# Locations resolved by other workers join the in-process index of resolved
+# locations when it's reloaded after this period, 0 disables reloading
+GEO_SPATIAL_RELOAD_SECS = int(os.getenv("GEO_SPATIAL_RELOAD_SECS", 600))
+
+_EARTH_RADIUS_KM = 6371.0
+_KM_PER_DEGREE = math.pi * _EARTH_RADIUS_KM / 180
+
+_NAMES_KEY = "geo:names"
+_MISS_KEY_PREFIX = "geo:miss:"
+
+
+def normalize_search_string(string: str) -> str:
+    """
+    Brings different spellings of the same name to one form: unicode
+    compatibility form, case and whitespace are normalized.
+    """
+
+    return " ".join(unicodedata.normalize("NFKC", string).casefold().split())
+
+
+def snap_coordinate(value: float) -> float:
+    if GEO_SNAP_DEGREES <= 0:
+        return value
+    # rounding of the product drops float noise like 55.750000000000004
+    return round(round(value / GEO_SNAP_DEGREES) * GEO_SNAP_DEGREES, 6)
+
+
+def geo_query(
+    search_string: str | None, longitude: float | None, latitude: float | None
+) -> str:
+    """
+    Index field of normalized lookup. Names and coordinates never clash since
+    names always contain a letter while coordinates contain none. Coordinates
+    are in the same "latitude,longitude" order as in AccuWeather queries.
+    """
+
+    if search_string is not None:
+        return search_string
+    return f"{latitude},{longitude}"
+
+
+def _is_coordinates_query(query: str) -> bool:
+    try:
+        longitude, latitude = query.split(",")
+        float(longitude), float(latitude)
+    except ValueError:
+        return False
+    return True
+
+
+def _miss_key(query: str) -> str:
+    return _MISS_KEY_PREFIX + hashlib.md5(query.encode("utf-8")).hexdigest()
+
+
+def distance_km(
+    longitude1: float, latitude1: float, longitude2: float, latitude2: float
+) -> float:
+    """
+    Great-circle (haversine) distance between two points.
+    """
+
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(longitude2 - longitude1)
+    a = (
+        math.sin(dphi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    )
+    return 2 * _EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialIndex:
+    """
+    In-memory grid of locations for nearest neighbour search. Cells are as
+    large as the search radius along meridians, so only adjacent cells are
+    scanned; along parallels it takes more of them closer to the poles.
+    """
+
+    def __init__(self, radius_km: float):
+        self.radius_km = radius_km
+        self._cell = max(radius_km, 0.001) / _KM_PER_DEGREE
+        self._longitudes = array("d")
+        self._latitudes = array("d")
+        self._geos: list[bytes] = []
+        self._ids: set[str] = set()
+        self._cells: dict[tuple[int, int], list[int]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._geos)
+
+    def _cell_of(self, longitude: float, latitude: float) -> tuple[int, int]:
+        return math.floor(longitude / self._cell), math.floor(latitude / self._cell)
+
+    def insert(self, geo: bytes):
+        location = json.loads(geo)
+        longitude, latitude = location["longitude"], location["latitude"]
+        with self._lock:
+            if location["id"] in self._ids:
+                return
+            self._ids.add(location["id"])
+            self._longitudes.append(longitude)
+            self._latitudes.append(latitude)
+            self._geos.append(geo)
+            cell = self._cell_of(longitude, latitude)
+            self._cells.setdefault(cell, []).append(len(self._geos) - 1)
+
+    def nearest(self, longitude: float, latitude: float) -> bytes | None:
+        """
+        Returns json of the closest location within the radius, if any.
+        """
+
+        x, y = self._cell_of(longitude, latitude)
+        cos_latitude = math.cos(math.radians(min(abs(latitude) + self._cell, 90)))
+        dx = min(math.ceil(1 / max(cos_latitude, 1e-6)), math.ceil(360 / self._cell))
+        found, found_distance = None, self.radius_km
+        for i in range(x - dx, x + dx + 1):
+            for j in range(y - 1, y + 2):
+                for entry in self._cells.get((i, j), ()):
+                    distance = distance_km(
+                        longitude,
+                        latitude,
+                        self._longitudes[entry],
+                        self._latitudes[entry],
+                    )
+                    if distance <= found_distance:
+                        found, found_distance = self._geos[entry], distance
+        return found
+
+
+class GeoIndex:
+    """
+    Persistent mapping of normalized names and snapped coordinates to
+    resolved locations. Location keys essentially never change, so the mapping
+    doesn't expire. Failed lookups are remembered for `GEO_MISS_TTL` seconds.
+    """
+
+    def __init__(self, redis_connection, local_entries: int = 4096):
+        self._r = redis_connection
+        # positive lookups never change, so they're also kept in-process
+        self._local = LocalCache(local_entries, local_entries * 1024)
+        # loaded from resolved locations on the first coordinates lookup and
+        # reloaded every `GEO_SPATIAL_RELOAD_SECS`
+        self._spatial: SpatialIndex | None = None
+        self._spatial_loaded_at = 0.0
+        self._spatial_lock = threading.Lock()
+
+    def _load_spatial(self, geos: Iterable[bytes]) -> SpatialIndex:
+        spatial = SpatialIndex(GEO_NEAREST_KM)
+        for geo in geos:
+            spatial.insert(geo)
+        return spatial
+
+    def _claim_spatial_reload(self) -> bool:
+        """
+        Whether the caller should reload the loaded spatial index. Only one
+        caller reloads it, the others keep using the loaded one meanwhile.
+        """
+
+        if GEO_SPATIAL_RELOAD_SECS <= 0:
+            return False
+        now = time.monotonic()
+        with self._spatial_lock:
+            if now - self._spatial_loaded_at < GEO_SPATIAL_RELOAD_SECS:
+                return False
+            self._spatial_loaded_at = now
+            return True
+
+    def nearest(self, longitude: float, latitude: float) -> bytes | None:
+        """
+        Returns json of already resolved location within `GEO_NEAREST_KM`
+        of the point.
+        """
+
+        if GEO_NEAREST_KM <= 0:
+            return None
+        if self._spatial is None:
+            with self._spatial_lock:
+                if self._spatial is None:
+                    geos = (geo for _, geo in self._r.hscan_iter(_NAMES_KEY))
+                    self._spatial = self._load_spatial(geos)
+                    self._spatial_loaded_at = time.monotonic()
+        elif self._claim_spatial_reload():
+            geos = (geo for _, geo in self._r.hscan_iter(_NAMES_KEY))
+            self._spatial = self._load_spatial(geos)
+        return self._spatial.nearest(longitude, latitude)
+
+    def lookup(self, query: str) -> tuple[bool, bytes | None]:
+        """
+        Returns whether the query is known and json of its location if it's
+        been found.
+        """
+
+        if (entry := self._local.get(query)) is not None:
+            return True, entry[1]
+        with self._r.pipeline(transaction=False) as pipe:
+            geo, missing = (
+                pipe.hget(_NAMES_KEY, query).exists(_miss_key(query)).execute()
+            )
+        if geo is not None:
+            self._local.put(query, 0, geo, len(geo))
+            return True, geo
+        return bool(missing), None
+
+    def remember(self, query: str, geo: bytes | None):
+        if geo is None:
+            self._r.set(_miss_key(query), 1, ex=GEO_MISS_TTL)
+            return
+        self._r.hset(_NAMES_KEY, query, geo)
+        self._local.put(query, 0, geo, len(geo))
+        if self._spatial is not None:
+            self._spatial.insert(geo)
+
+    def names(self) -> Iterable[tuple[str, bytes]]:
+        """
+        Iterates over resolved names (not coordinates) and their locations.
+        """
+
+        for query, geo in self._r.hscan_iter(_NAMES_KEY):
+            query = query.decode("utf-8")
+            if not _is_coordinates_query(query):
+                yield query, geo
+
+
+class AsyncGeoIndex(GeoIndex):
+    """
+    `GeoIndex` over asyncio redis connection.
+    """
+
+    async def lookup(self, query: str) -> tuple[bool, bytes | None]:
+        if (entry := self._local.get(query)) is not None:
+            return True, entry[1]
+        async with self._r.pipeline(transaction=False) as pipe:
+            geo, missing = (
+                await pipe.hget(_NAMES_KEY, query).exists(_miss_key(query)).execute()
+            )
+        if geo is not None:
+            self._local.put(query, 0, geo, len(geo))
+            return True, geo
+        return bool(missing), None
+
+    async def remember(self, query: str, geo: bytes | None):
+        if geo is None:
+            await self._r.set(_miss_key(query), 1, ex=GEO_MISS_TTL)
+            return
+        await self._r.hset(_NAMES_KEY, query, geo)
+        self._local.put(query, 0, geo, len(geo))
+        if self._spatial is not None:
+            self._spatial.insert(geo)
+
+    async def nearest(self, longitude: float, latitude: float) -> bytes | None:
+        if GEO_NEAREST_KM <= 0:
+            return None
+        if self._spatial is None:
+            geos = [geo async for _, geo in self._r.hscan_iter(_NAMES_KEY)]
+            # other coroutine could load it while this one was scanning
+            if self._spatial is None:
+                self._spatial = self._load_spatial(geos)
+                self._spatial_loaded_at = time.monotonic()
+        elif self._claim_spatial_reload():
+            geos = [geo async for _, geo in self._r.hscan_iter(_NAMES_KEY)]
+            self._spatial = self._load_spatial(geos)
+        return self._spatial.nearest(longitude, latitude)
+
+
+geo_index = GeoIndex(cache._r)
+
+async_geo_index = AsyncGeoIndex(cache_async._r)
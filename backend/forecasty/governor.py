@@ -0,0 +1,201 @@
+import os
+import time
+import asyncio
+import logging
+import datetime
+
+from collections import Counter
+from typing import NamedTuple
+from . import cache, cache_async
+from .keypool import configured_keys
+
+logger = logging.getLogger(__name__)
+
+# Upstream calls per second allowed across all workers and bursts above it
+UPSTREAM_RATE = float(os.getenv("UPSTREAM_RATE", 5))
+UPSTREAM_BURST = int(os.getenv("UPSTREAM_BURST", 10))
+# Daily limit of calls per api key (50 for free AccuWeather keys)
+UPSTREAM_KEY_DAILY_QUOTA = int(os.getenv("UPSTREAM_KEY_DAILY_QUOTA", 50))
+# Daily limit of upstream calls across all keys, 0 disables it
+UPSTREAM_DAILY_QUOTA = int(
+    os.getenv(
+        "UPSTREAM_DAILY_QUOTA",
+        UPSTREAM_KEY_DAILY_QUOTA * max(1, len(configured_keys())),
+    )
+)
+# Share of daily quota and of burst reserved for calls serving requests.
+# Background refreshes are denied once they reach it, so stale cached outputs
+# are served instead, leaving the rest for cache misses.
+UPSTREAM_BACKGROUND_RESERVE = float(os.getenv("UPSTREAM_BACKGROUND_RESERVE", 0.3))
+# How long call serving a request may wait for the rate limit
+UPSTREAM_MAX_WAIT = float(os.getenv("UPSTREAM_MAX_WAIT", 2))
+
+_BUCKET_KEY = "upstream:bucket"
+_CALLS_KEY_PREFIX = "upstream:calls:"
+
+# Token bucket refilled at `rate` tokens per second up to `burst`, and daily
+# calls counter. Server time is used, so clocks of workers don't matter.
+#
+# KEYS: bucket hash, daily calls counter
+# ARGV: rate, burst, daily quota, reserved tokens, reserved daily calls
+_ACQUIRE_SCRIPT = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local quota = tonumber(ARGV[3])
+local reserved_tokens, reserved_calls = tonumber(ARGV[4]), tonumber(ARGV[5])
+
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "timestamp")
+local tokens = tonumber(bucket[1]) or burst
+local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+tokens = math.min(burst, tokens + elapsed * rate)
+local spent = tonumber(redis.call("GET", KEYS[2])) or 0
+
+local reason = "ok"
+if quota > 0 and spent >= quota - reserved_calls then
+    reason = "quota"
+elseif tokens < 1 + reserved_tokens then
+    reason = "rate"
+else
+    tokens = tokens - 1
+    spent = redis.call("INCR", KEYS[2])
+    redis.call("EXPIRE", KEYS[2], 2 * 24 * 3600)
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "timestamp", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(burst / rate) + 1)
+-- floats would be truncated to integers in reply
+return {reason, tostring(tokens), spent}
+"""
+
+
+class Grant(NamedTuple):
+    reason: str  # "ok", or why the call is denied: "quota" or "rate"
+    tokens: float
+    spent: int
+
+
+# Per-worker counters of granted and denied calls by priority
+_stats = Counter()
+
+
+def _calls_key() -> str:
+    # quota is reset daily at midnight UTC
+    return _CALLS_KEY_PREFIX + datetime.datetime.now(datetime.UTC).date().isoformat()
+
+
+def _status(spent: int) -> dict:
+    remaining = max(0, UPSTREAM_DAILY_QUOTA - spent) if UPSTREAM_DAILY_QUOTA else None
+    return {
+        "daily_quota": UPSTREAM_DAILY_QUOTA,
+        "daily_spent": spent,
+        "daily_remaining": remaining,
+    }
+
+
+def _priority(background: bool) -> str:
+    return "background" if background else "interactive"
+
+
+class Governor:
+    """
+    Cluster-wide limiter of upstream calls: rate limit with bursts and daily
+    quota. Calls refreshing cache in background (see `cache.in_background`)
+    are deprioritized: they can't use reserved part of the limits and never
+    wait for them.
+    """
+
+    def __init__(self, redis_connection):
+        self._r = redis_connection
+        self._script = redis_connection.register_script(_ACQUIRE_SCRIPT)
+
+    def _script_args(self, background: bool) -> tuple[list, list]:
+        reserve = UPSTREAM_BACKGROUND_RESERVE if background else 0
+        return [_BUCKET_KEY, _calls_key()], [
+            UPSTREAM_RATE,
+            UPSTREAM_BURST,
+            UPSTREAM_DAILY_QUOTA,
+            UPSTREAM_BURST * reserve,
+            UPSTREAM_DAILY_QUOTA * reserve,
+        ]
+
+    def _grant(self, reply: list, background: bool) -> Grant:
+        reason, tokens, spent = reply
+        grant = Grant(reason.decode(), float(tokens), int(spent))
+        if grant.reason == "ok":
+            _stats[f"{_priority(background)}_allowed"] += 1
+        return grant
+
+    def _wait_secs(self, grant: Grant, background: bool, deadline: float) -> float:
+        """
+        Returns how long to wait before retrying denied call, or -1 if it
+        mustn't be retried.
+        """
+
+        wait = (1 - grant.tokens) / UPSTREAM_RATE
+        if background or grant.reason != "rate" or time.monotonic() + wait > deadline:
+            _stats[f"{_priority(background)}_throttled_{grant.reason}"] += 1
+            logger.warning(
+                f"Throttled {_priority(background)} upstream call: {grant.reason}"
+            )
+            return -1
+        return wait
+
+    def acquire(self) -> bool:
+        """
+        Takes permission for one upstream call, waiting for rate limit up to
+        `UPSTREAM_MAX_WAIT` seconds. Returns whether the call is allowed.
+        """
+
+        background = cache.in_background()
+        deadline = time.monotonic() + UPSTREAM_MAX_WAIT
+        while True:
+            keys, args = self._script_args(background)
+            grant = self._grant(self._script(keys=keys, args=args), background)
+            if grant.reason == "ok":
+                return True
+            if (wait := self._wait_secs(grant, background, deadline)) < 0:
+                return False
+            time.sleep(wait)
+
+    def status(self) -> dict:
+        """
+        Returns today's quota and how much of it is spent by the cluster.
+        """
+
+        spent = int(self._r.get(_calls_key()) or 0)
+        return _status(spent)
+
+
+class AsyncGovernor(Governor):
+    """
+    `Governor` over asyncio redis connection.
+    """
+
+    async def acquire(self) -> bool:
+        background = cache.in_background()
+        deadline = time.monotonic() + UPSTREAM_MAX_WAIT
+        while True:
+            keys, args = self._script_args(background)
+            grant = self._grant(await self._script(keys=keys, args=args), background)
+            if grant.reason == "ok":
+                return True
+            if (wait := self._wait_secs(grant, background, deadline)) < 0:
+                return False
+            await asyncio.sleep(wait)
+
+    async def status(self) -> dict:
+        spent = int(await self._r.get(_calls_key()) or 0)
+        return _status(spent)
+
+
+def stats() -> dict[str, int]:
+    return {
+        f"{_priority(background)}_{event}": _stats[f"{_priority(background)}_{event}"]
+        for background in (False, True)
+        for event in ("allowed", "throttled_rate", "throttled_quota")
+    }
+
+
+governor = Governor(cache._r)
+
+async_governor = AsyncGovernor(cache_async._r)
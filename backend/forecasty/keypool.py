@@ -0,0 +1,128 @@
+import os
+import re
+import hashlib
+import logging
+import datetime
+import traceback
+
+logger = logging.getLogger(__name__)
+
+_USAGE_KEY_PREFIX = "upstream:keys:"
+# Query string of an url or path in error messages, it carries the api key
+_API_KEY_PARAM = re.compile(r"(apikey=)([^&\s'\"()]+)")
+_URL_QUERY = re.compile(r"\?[^\s'\"()]*=[^\s'\"()]*")
+
+
+def _usage_key() -> str:
+    # keys' quotas are reset daily, as well as their usage
+    return _USAGE_KEY_PREFIX + datetime.datetime.now(datetime.UTC).date().isoformat()
+
+
+def configured_keys(api_keys: str | None = None) -> list[str]:
+    """
+    Returns given comma-separated api keys, or the ones set in `API_KEYS` (or
+    a single `API_KEY`) environment variable.
+    """
+
+    api_keys = api_keys or os.getenv("API_KEYS") or os.getenv("API_KEY") or ""
+    return [key.strip() for key in api_keys.split(",") if key.strip()]
+
+
+def key_id(api_key: str) -> str:
+    """
+    Identifies api key in redis and logs without revealing it.
+    """
+
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def redact(text: str) -> str:
+    """
+    Replaces api keys given as `apikey` url params in the text with their ids.
+    """
+
+    return _API_KEY_PARAM.sub(lambda match: match[1] + key_id(match[2]), text)
+
+
+def log_exception(logger: logging.Logger, message: str):
+    """
+    `logger.exception` with api keys in the traceback redacted.
+    """
+
+    logger.error(f"{message}\n{redact(traceback.format_exc().rstrip())}")
+
+
+def describe_error(error: Exception) -> str:
+    """
+    Type and message of the error with query strings of urls cut, so it can
+    be shared with other workers and clients.
+    """
+
+    message = _URL_QUERY.sub("", str(error))
+    return f"{type(error).__name__}: {message}" if message else type(error).__name__
+
+
+def _choose(api_keys: list[str], usage: dict[bytes, bytes]) -> str | None:
+    available = [
+        api_key
+        for api_key in api_keys
+        if f"{key_id(api_key)}:exhausted".encode() not in usage
+    ]
+    if not available:
+        return None
+    return min(
+        available, key=lambda api_key: int(usage.get(key_id(api_key).encode(), 0))
+    )
+
+
+class KeyPool:
+    """
+    Api keys shared by all workers. Calls are spread over keys by their daily
+    usage, keys whose quota is exhausted are skipped until the next UTC day.
+    """
+
+    def __init__(self, redis_connection, api_keys: list[str]):
+        self._r = redis_connection
+        self._api_keys = api_keys
+
+    def choose(self) -> str | None:
+        """
+        Returns least used key with remaining quota, if any.
+        """
+
+        return _choose(self._api_keys, self._r.hgetall(_usage_key()))
+
+    def record(self, api_key: str):
+        with self._r.pipeline(transaction=False) as pipe:
+            pipe.hincrby(_usage_key(), key_id(api_key), 1)
+            pipe.expire(_usage_key(), 2 * 24 * 3600)
+            pipe.execute()
+
+    def exhaust(self, api_key: str):
+        logger.warning(f"Api key {key_id(api_key)} is exhausted, rotating it")
+        with self._r.pipeline(transaction=False) as pipe:
+            pipe.hset(_usage_key(), f"{key_id(api_key)}:exhausted", 1)
+            pipe.expire(_usage_key(), 2 * 24 * 3600)
+            pipe.execute()
+
+
+class AsyncKeyPool(KeyPool):
+    """
+    `KeyPool` over asyncio redis connection.
+    """
+
+    async def choose(self) -> str | None:
+        return _choose(self._api_keys, await self._r.hgetall(_usage_key()))
+
+    async def record(self, api_key: str):
+        async with self._r.pipeline(transaction=False) as pipe:
+            pipe.hincrby(_usage_key(), key_id(api_key), 1)
+            pipe.expire(_usage_key(), 2 * 24 * 3600)
+            await pipe.execute()
+
+    async def exhaust(self, api_key: str):
+        logger.warning(f"Api key {key_id(api_key)} is exhausted, rotating it")
+        async with self._r.pipeline(transaction=False) as pipe:
+            pipe.hset(_usage_key(), f"{key_id(api_key)}:exhausted", 1)
+            pipe.expire(_usage_key(), 2 * 24 * 3600)
+            await pipe.execute()
@@ -0,0 +1,63 @@
+import os
+import math
+import logging
+
+from . import cache, cache_async
+from .api import Geo
+
+logger = logging.getLogger(__name__)
+
+# Requests made this long ago weigh half as much as the ones made now
+POPULARITY_HALF_LIFE = int(os.getenv("POPULARITY_HALF_LIFE", 6 * 3600))
+# Locations whose score decays below this are forgotten
+POPULARITY_MIN_SCORE = float(os.getenv("POPULARITY_MIN_SCORE", 0.05))
+
+_SCORES_KEY = "popular:scores"
+_GEOS_KEY = "popular:geos"
+
+
+def record(geo: Geo):
+    """
+    Counts a request for weather of the location.
+    """
+
+    with cache._r.pipeline(transaction=False) as pipe:
+        pipe.zincrby(_SCORES_KEY, 1, geo.id)
+        pipe.hset(_GEOS_KEY, geo.id, geo.model_dump_json())
+        pipe.execute()
+
+
+async def record_async(geo: Geo):
+    async with cache_async._r.pipeline(transaction=False) as pipe:
+        pipe.zincrby(_SCORES_KEY, 1, geo.id)
+        pipe.hset(_GEOS_KEY, geo.id, geo.model_dump_json())
+        await pipe.execute()
+
+
+def decay(elapsed: float):
+    """
+    Scales all scores down as `elapsed` seconds have passed and forgets
+    locations nobody asks for anymore.
+    """
+
+    factor = math.pow(0.5, elapsed / POPULARITY_HALF_LIFE)
+    cache._r.zunionstore(_SCORES_KEY, {_SCORES_KEY: factor})
+    forgotten = cache._r.zrangebyscore(_SCORES_KEY, 0, POPULARITY_MIN_SCORE)
+    if forgotten:
+        with cache._r.pipeline() as pipe:
+            pipe.zrem(_SCORES_KEY, *forgotten)
+            pipe.hdel(_GEOS_KEY, *forgotten)
+            pipe.execute()
+        logger.info(f"Forgot {len(forgotten)} unpopular locations")
+
+
+def top(count: int) -> list[Geo]:
+    """
+    Returns most requested locations, the most popular first.
+    """
+
+    ids = cache._r.zrevrange(_SCORES_KEY, 0, count - 1)
+    if not ids:
+        return []
+    geos = cache._r.hmget(_GEOS_KEY, ids)
+    return [Geo.model_validate_json(geo) for geo in geos if geo is not None]
@@ -0,0 +1,85 @@
+import os
+import atexit
+import logging
+import threading
+
+from flask import Flask, current_app
+from typing import Callable
+from .api import Provider, AccuWeather, ApiException
+from .api_async import AsyncProvider, AsyncAccuWeather
+
+logger = logging.getLogger(__name__)
+
+# Weather providers which can be selected by name, e.g. through PROVIDER env var
+PROVIDERS: dict[str, Callable[[], Provider]] = {
+    "accuweather": AccuWeather,
+}
+
+# Their counterparts served by ASGI app
+ASYNC_PROVIDERS: dict[str, Callable[[], AsyncProvider]] = {
+    "accuweather": AsyncAccuWeather,
+}
+
+_EXTENSION = "forecasty.provider"
+
+
+class ProviderLifecycle:
+    """
+    Holds the only provider instance of a worker process. Provider is created
+    lazily since gunicorn forks workers after the app is made, and provider's
+    connection pools mustn't be shared between processes.
+    """
+
+    def __init__(self, factory: Callable[[], Provider]):
+        self._factory = factory
+        self._provider: Provider | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def get(self) -> Provider:
+        with self._lock:
+            if self._provider is None or self._pid != os.getpid():
+                self._provider = self._factory()
+                self._pid = os.getpid()
+                logger.info(f"Created {type(self._provider).__name__} provider")
+            return self._provider
+
+    def close(self):
+        with self._lock:
+            # provider inherited from parent process is closed by the parent
+            if self._provider is not None and self._pid == os.getpid():
+                self._provider.close()
+            self._provider = None
+
+
+def resolve_factory(provider: str | Callable | None, registry: dict) -> Callable:
+    """
+    Provider is either a name from the registry, a factory (e.g. stub
+    provider), or taken from PROVIDER env var if it's None.
+    """
+
+    if provider is None:
+        provider = os.getenv("PROVIDER", "accuweather")
+    if isinstance(provider, str):
+        if provider not in registry:
+            raise ApiException(f"Unknown weather provider {provider}")
+        provider = registry[provider]
+    return provider
+
+
+def init_app(app: Flask, provider: str | Callable[[], Provider] | None = None):
+    """
+    Attaches provider lifecycle to the app, see `resolve_factory`.
+    """
+
+    factory = resolve_factory(provider, PROVIDERS)
+    app.extensions[_EXTENSION] = ProviderLifecycle(factory)
+
+
+def close_app(app: Flask):
+    app.extensions[_EXTENSION].close()
+
+
+def get_provider() -> Provider:
+    return current_app.extensions[_EXTENSION].get()
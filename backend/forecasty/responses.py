@@ -0,0 +1,107 @@
+import os
+import gzip
+import json
+import flask
+import hashlib
+import quart
+import brotli
+import pydantic_core
+
+from flask.json.provider import JSONProvider
+from datetime import datetime, timezone
+from .cache import Freshness
+
+# Bodies smaller than this are sent as they are, compressing them isn't worth
+# the CPU time
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+# Moderate levels keep most of the ratio at a fraction of the highest's cost
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+
+# Supported encodings in order of preference
+_COMPRESSORS = {
+    "br": lambda body: brotli.compress(body, quality=BROTLI_QUALITY),
+    "gzip": lambda body: gzip.compress(body, GZIP_LEVEL, mtime=0),
+}
+
+
+class FastJSONProvider(JSONProvider):
+    """
+    Renders dicts returned by routes with pydantic's serializer, which is
+    several times faster than json module. Keys keep their order.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        return pydantic_core.to_json(obj).decode("utf-8")
+
+    def loads(self, s: str | bytes, **kwargs):
+        return json.loads(s, **kwargs)
+
+
+def set_validators(response, body: bytes, freshness: Freshness):
+    """
+    Sets ETag of the body, and Last-Modified and max-age from freshness of
+    cached data it's made of, so repeated requests are answered with 304 Not
+    Modified or not made at all.
+    """
+
+    # weak, since the same body is sent compressed differently
+    response.set_etag(hashlib.blake2b(body, digest_size=16).hexdigest(), weak=True)
+    response.cache_control.public = True
+    response.cache_control.max_age = freshness.max_age()
+    if freshness.timestamp is not None:
+        response.last_modified = datetime.fromtimestamp(
+            freshness.timestamp, timezone.utc
+        )
+
+
+def compressible(response) -> bool:
+    return (
+        response.status_code == 200
+        and response.mimetype == "application/json"
+        and "Content-Encoding" not in response.headers
+    )
+
+
+def compress(response, body: bytes, accept_encodings) -> bytes | None:
+    """
+    Returns body compressed with the best encoding client accepts and sets
+    response headers accordingly, or None if it's sent as it is.
+    """
+
+    # the body depends on the header, so caches must tell them apart
+    response.vary.add("Accept-Encoding")
+    if len(body) < COMPRESS_MIN_BYTES:
+        return None
+    if (encoding := accept_encodings.best_match(_COMPRESSORS)) is None:
+        return None
+    response.headers["Content-Encoding"] = encoding
+    return _COMPRESSORS[encoding](body)
+
+
+def init_app(app: flask.Flask):
+    app.json = FastJSONProvider(app)
+
+    @app.after_request
+    def compress_response(response):
+        if response.direct_passthrough or not compressible(response):
+            return response
+        body = compress(response, response.get_data(), flask.request.accept_encodings)
+        if body is not None:
+            response.set_data(body)
+        return response
+
+
+def init_async_app(app: quart.Quart):
+    app.json = FastJSONProvider(app)
+
+    @app.after_request
+    async def compress_response(response):
+        if not compressible(response):
+            return response
+        body = compress(
+            response, await response.get_data(), quart.request.accept_encodings
+        )
+        if body is not None:
+            response.set_data(body)
+        return response
@@ -1,16 +1,59 @@
-import json
 import os
-from flask import Blueprint, request
-from . import api
+import logging
+import contextvars
+import pydantic_core
+from flask import Blueprint, Response, request
+from concurrent.futures import ThreadPoolExecutor
+from . import api, cache, governor, popularity, responses, trips
+from .gazetteer import gazetteer
+from .providers import get_provider
+
+logger = logging.getLogger(__name__)
 
 forecast_bp = Blueprint("forecast_bp", __name__)
 
+# Kinds of batch requests and forecast params they map to, None stands for
+# current conditions
+BATCH_KINDS = {
+    "current": None,
+    "12hours": (api.ForecastDelta.hour, 12),
+    "5days": (api.ForecastDelta.day, 5),
+}
+BATCH_MAX_LOCATIONS = 25
+_BATCH_WORKERS = 8
+
+
+def flag_param(value: str | None) -> bool:
+    return value is not None and value.lower() in ("1", "true", "yes")
+
+
+def compact_param(value: str | None) -> bool:
+    # `format=compact` asks for forecasts with geo given once and columns of
+    # units' fields instead of units
+    return value == "compact"
+
+
+def cached_response(body: bytes, freshness: cache.Freshness) -> Response:
+    """
+    Json response which clients and proxies may reuse while the cached data
+    it's made of is fresh.
+    """
+
+    response = Response(body, mimetype="application/json")
+    responses.set_validators(response, body, freshness)
+    return response.make_conditional(request)
+
 
 def location_parse(string, provider) -> api.Geo | None:
+    # coordinates are given as "latitude,longitude", like AccuWeather takes them
     if len(string_coords := string.split(",")) == 2:
-        coords = [float(coord) for coord in string_coords]
-        return provider.get_geo(longitude=coords[0], latitude=coords[1])
-    return provider.get_geo(search_string=string)
+        latitude, longitude = (float(coord) for coord in string_coords)
+        geo = provider.get_geo(longitude=longitude, latitude=latitude)
+    else:
+        geo = provider.get_geo(search_string=string)
+    if geo is not None:
+        popularity.record(geo)
+    return geo
 
 
 @forecast_bp.route("/accu/forecast/5days")
@@ -18,17 +61,23 @@ def five_days_forecast():
     if (location := request.args.get("location")) is None:
         return {"status": "error", "message": "location query param must be provided"}
 
-    provider = api.AccuWeather()
+    provider = get_provider()
 
     if (geo := location_parse(location, provider)) is None:
         return {"status": "error", "message": "could not parse location query param"}
 
-    forecast = provider.get_forecast(delta=api.ForecastDelta.day, geo=geo, longs=5)
+    with cache.track_freshness() as freshness:
+        forecast = provider.get_forecast_json(
+            delta=api.ForecastDelta.day,
+            geo=geo,
+            longs=5,
+            compact=compact_param(request.args.get("format")),
+        )
 
     if forecast is None:
         return {"status": "error", "message": "could not get forecast"}
 
-    return forecast.model_dump()
+    return cached_response(forecast, freshness)
 
 
 @forecast_bp.route("/accu/forecast/12hours")
@@ -36,17 +85,23 @@ def twelve_hours_forecast():
     if (location := request.args.get("location")) is None:
         return {"status": "error", "message": "location query param must be provided"}
 
-    provider = api.AccuWeather()
+    provider = get_provider()
 
     if (geo := location_parse(location, provider)) is None:
         return {"status": "error", "message": "could not parse location query param"}
 
-    forecast = provider.get_forecast(delta=api.ForecastDelta.hour, geo=geo, longs=12)
+    with cache.track_freshness() as freshness:
+        forecast = provider.get_forecast_json(
+            delta=api.ForecastDelta.hour,
+            geo=geo,
+            longs=12,
+            compact=compact_param(request.args.get("format")),
+        )
 
     if forecast is None:
         return {"status": "error", "message": "could not get forecast"}
 
-    return forecast.model_dump()
+    return cached_response(forecast, freshness)
 
 
 @forecast_bp.route("/accu/currentconditions")
@@ -54,14 +109,215 @@ def current_conditions():
     if (location := request.args.get("location")) is None:
         return {"status": "error", "message": "location query param must be provided"}
 
-    provider = api.AccuWeather()
+    provider = get_provider()
 
     if (geo := location_parse(location, provider)) is None:
         return {"status": "error", "message": "could not parse location query param"}
 
-    conds = provider.get_conditions(geo=geo)
+    # approximate conditions may be derived from cached hourly forecast
+    approximate = flag_param(request.args.get("approximate"))
+    with cache.track_freshness() as freshness:
+        conds = provider.get_conditions(geo=geo, approximate=approximate)
 
     if conds is None:
         return {"status": "error", "message": "could not get forecast"}
 
-    return conds.model_dump()
+    return cached_response(conds.model_dump_json().encode(), freshness)
+
+
+def locations_params_error(locations: list[str]) -> dict | None:
+    if not locations:
+        return {"status": "error", "message": "location query param must be provided"}
+    if len(locations) > BATCH_MAX_LOCATIONS:
+        return {
+            "status": "error",
+            "message": f"at most {BATCH_MAX_LOCATIONS} locations can be requested",
+        }
+
+
+def batch_params_error(locations: list[str], kind: str | None) -> dict | None:
+    if error := locations_params_error(locations):
+        return error
+    if kind not in BATCH_KINDS:
+        return {
+            "status": "error",
+            "message": f"kind query param must be one of {', '.join(BATCH_KINDS)}",
+        }
+
+
+def batch_body(locations: list[str], results: list[bytes | dict]) -> bytes:
+    """
+    Renders per-location results: json bodies as they're returned by single
+    location routes or error dicts. Bodies are embedded without re-parsing.
+    """
+
+    parts = []
+    for location, result in zip(locations, results):
+        if isinstance(result, dict):
+            parts.append(pydantic_core.to_json({"location": location, **result}))
+        else:
+            location = pydantic_core.to_json(location)
+            parts.append(
+                b'{"location":%s,"status":"ok","data":%s}' % (location, result)
+            )
+    return b'{"status":"ok","results":[%s]}' % b",".join(parts)
+
+
+def _location_weather(
+    provider, location: str, kind: str, approximate: bool, compact: bool
+) -> bytes | dict:
+    try:
+        if (geo := location_parse(location, provider)) is None:
+            return {"status": "error", "message": "could not parse location"}
+        if (forecast_params := BATCH_KINDS[kind]) is None:
+            conds = provider.get_conditions(geo=geo, approximate=approximate)
+            body = None if conds is None else conds.model_dump_json().encode()
+        else:
+            delta, longs = forecast_params
+            body = provider.get_forecast_json(
+                geo=geo, delta=delta, longs=longs, compact=compact
+            )
+    except Exception:
+        log_exception(logger, f"Failed to get {kind} weather for {location}")
+        body = None
+    if body is None:
+        return {"status": "error", "message": "could not get forecast"}
+    return body
+
+
+@forecast_bp.route("/accu/batch")
+def batch():
+    """
+    Weather of several locations at once: `location` query param is repeated
+    for each of them, `kind` is one of `BATCH_KINDS`. Locations are resolved
+    concurrently, failures are reported per location.
+    """
+
+    locations = request.args.getlist("location")
+    kind = request.args.get("kind")
+    approximate = flag_param(request.args.get("approximate"))
+    compact = compact_param(request.args.get("format"))
+    if error := batch_params_error(locations, kind):
+        return error
+
+    provider = get_provider()
+
+    with (
+        cache.track_freshness() as freshness,
+        ThreadPoolExecutor(min(len(locations), _BATCH_WORKERS)) as pool,
+    ):
+        # workers report freshness of their results through copies of this
+        # context
+        contexts = [contextvars.copy_context() for _ in locations]
+        results = list(
+            pool.map(
+                lambda context, location: context.run(
+                    _location_weather, provider, location, kind, approximate, compact
+                ),
+                contexts,
+                locations,
+            )
+        )
+
+    body = batch_body(locations, results)
+    # failures may be gone on the next request
+    if any(isinstance(result, dict) for result in results):
+        return Response(body, mimetype="application/json")
+    return cached_response(body, freshness)
+
+
+def trip_coords_error(locations: list[str]) -> dict | None:
+    # malformed "latitude,longitude" pairs are rejected before any lookup
+    malformed = []
+    for location in locations:
+        if len(coords := location.split(",")) == 2:
+            try:
+                [float(coord) for coord in coords]
+            except ValueError:
+                malformed.append(location)
+    if malformed:
+        return {
+            "status": "error",
+            "message": f"could not parse locations: {', '.join(malformed)}",
+        }
+
+
+def trip_geos_error(locations: list[str], geos: list[api.Geo | None]) -> dict | None:
+    if unknown := [location for location, geo in zip(locations, geos) if geo is None]:
+        return {
+            "status": "error",
+            "message": f"could not parse locations: {', '.join(unknown)}",
+        }
+
+
+@forecast_bp.route("/accu/route")
+def trip_weather():
+    """
+    Weather along the route through `location` query params in their order:
+    forecast of every waypoint at the time of arrival there. `departure` is
+    iso datetime (now by default) and `speed` is average speed in km/h.
+    """
+
+    locations = request.args.getlist("location")
+    if error := locations_params_error(locations):
+        return error
+    try:
+        departure, speed = trips.parse_trip_params(
+            request.args.get("departure"), request.args.get("speed")
+        )
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+    if error := trip_coords_error(locations):
+        return error
+
+    provider = get_provider()
+
+    with ThreadPoolExecutor(min(len(locations), _BATCH_WORKERS)) as pool:
+        geos = list(
+            pool.map(lambda location: location_parse(location, provider), locations)
+        )
+    if error := trip_geos_error(locations, geos):
+        return error
+
+    try:
+        with cache.track_freshness() as freshness:
+            trip = trips.TripPlanner(provider).trip_json(geos, departure, speed)
+    except Exception:
+        log_exception(logger, f"Failed to get weather along {', '.join(locations)}")
+        return {"status": "error", "message": "could not get forecast"}
+
+    return cached_response(trip, freshness)
+
+
+def complete_locations(prefix: str | None, limit: str | None) -> dict:
+    try:
+        limit = min(int(limit or 10), 50)
+    except ValueError:
+        return {"status": "error", "message": "limit query param must be a number"}
+    entries = gazetteer.complete(prefix or "", limit)
+    return {"status": "ok", "locations": [entry._asdict() for entry in entries]}
+
+
+@forecast_bp.route("/geo/complete")
+def geo_complete():
+    """
+    Autocompletes location names from the preloaded gazetteer.
+    """
+
+    return complete_locations(request.args.get("prefix"), request.args.get("limit"))
+
+
+@forecast_bp.route("/stats/cache")
+def cache_stats():
+    # counters are per worker, so tell which one has answered
+    return {"pid": os.getpid(), **cache.stats()}
+
+
+@forecast_bp.route("/stats/upstream")
+def upstream_stats():
+    return {
+        "pid": os.getpid(),
+        **governor.stats(),
+        **(governor.governor.status()),
+    }
@@ -0,0 +1,234 @@
+import os
+import asyncio
+import logging
+from quart import Blueprint, Quart, Response, current_app, request
+from typing import Callable
+from . import api, cache, governor, popularity, responses, trips
+from .api_async import AsyncProvider
+from .providers import ASYNC_PROVIDERS, resolve_factory
+from .routes import (
+    BATCH_KINDS,
+    batch_params_error,
+    batch_body,
+    compact_param,
+    complete_locations,
+    flag_param,
+    locations_params_error,
+    trip_coords_error,
+    trip_geos_error,
+)
+
+logger = logging.getLogger(__name__)
+
+async_forecast_bp = Blueprint("async_forecast_bp", __name__)
+
+_EXTENSION = "forecasty.async_provider"
+
+
+def init_app(app: Quart, provider: str | Callable[[], AsyncProvider] | None = None):
+    """
+    Creates provider when worker starts serving and closes it on shutdown, so
+    each worker has its own provider bound to its event loop.
+    """
+
+    factory = resolve_factory(provider, ASYNC_PROVIDERS)
+
+    @app.before_serving
+    async def open_provider():
+        app.extensions[_EXTENSION] = factory()
+
+    @app.after_serving
+    async def close_provider():
+        await app.extensions.pop(_EXTENSION).close()
+
+
+def get_provider() -> AsyncProvider:
+    return current_app.extensions[_EXTENSION]
+
+
+async def cached_response(body: bytes, freshness: cache.Freshness) -> Response:
+    response = Response(body, mimetype="application/json")
+    responses.set_validators(response, body, freshness)
+    return await response.make_conditional(request)
+
+
+async def location_parse(string, provider) -> api.Geo | None:
+    # coordinates are given as "latitude,longitude", like AccuWeather takes them
+    if len(string_coords := string.split(",")) == 2:
+        latitude, longitude = (float(coord) for coord in string_coords)
+        geo = await provider.get_geo(longitude=longitude, latitude=latitude)
+    else:
+        geo = await provider.get_geo(search_string=string)
+    if geo is not None:
+        await popularity.record_async(geo)
+    return geo
+
+
+@async_forecast_bp.route("/accu/forecast/5days")
+async def five_days_forecast():
+    if (location := request.args.get("location")) is None:
+        return {"status": "error", "message": "location query param must be provided"}
+
+    provider = get_provider()
+
+    if (geo := await location_parse(location, provider)) is None:
+        return {"status": "error", "message": "could not parse location query param"}
+
+    with cache.track_freshness() as freshness:
+        forecast = await provider.get_forecast_json(
+            delta=api.ForecastDelta.day,
+            geo=geo,
+            longs=5,
+            compact=compact_param(request.args.get("format")),
+        )
+
+    if forecast is None:
+        return {"status": "error", "message": "could not get forecast"}
+
+    return await cached_response(forecast, freshness)
+
+
+@async_forecast_bp.route("/accu/forecast/12hours")
+async def twelve_hours_forecast():
+    if (location := request.args.get("location")) is None:
+        return {"status": "error", "message": "location query param must be provided"}
+
+    provider = get_provider()
+
+    if (geo := await location_parse(location, provider)) is None:
+        return {"status": "error", "message": "could not parse location query param"}
+
+    with cache.track_freshness() as freshness:
+        forecast = await provider.get_forecast_json(
+            delta=api.ForecastDelta.hour,
+            geo=geo,
+            longs=12,
+            compact=compact_param(request.args.get("format")),
+        )
+
+    if forecast is None:
+        return {"status": "error", "message": "could not get forecast"}
+
+    return await cached_response(forecast, freshness)
+
+
+@async_forecast_bp.route("/accu/currentconditions")
+async def current_conditions():
+    if (location := request.args.get("location")) is None:
+        return {"status": "error", "message": "location query param must be provided"}
+
+    provider = get_provider()
+
+    if (geo := await location_parse(location, provider)) is None:
+        return {"status": "error", "message": "could not parse location query param"}
+
+    approximate = flag_param(request.args.get("approximate"))
+    with cache.track_freshness() as freshness:
+        conds = await provider.get_conditions(geo=geo, approximate=approximate)
+
+    if conds is None:
+        return {"status": "error", "message": "could not get forecast"}
+
+    return await cached_response(conds.model_dump_json().encode(), freshness)
+
+
+async def _location_weather(
+    provider, location: str, kind: str, approximate: bool, compact: bool
+) -> bytes | dict:
+    try:
+        if (geo := await location_parse(location, provider)) is None:
+            return {"status": "error", "message": "could not parse location"}
+        if (forecast_params := BATCH_KINDS[kind]) is None:
+            conds = await provider.get_conditions(geo=geo, approximate=approximate)
+            body = None if conds is None else conds.model_dump_json().encode()
+        else:
+            delta, longs = forecast_params
+            body = await provider.get_forecast_json(
+                geo=geo, delta=delta, longs=longs, compact=compact
+            )
+    except Exception:
+        log_exception(logger, f"Failed to get {kind} weather for {location}")
+        body = None
+    if body is None:
+        return {"status": "error", "message": "could not get forecast"}
+    return body
+
+
+@async_forecast_bp.route("/accu/batch")
+async def batch():
+    locations = request.args.getlist("location")
+    kind = request.args.get("kind")
+    approximate = flag_param(request.args.get("approximate"))
+    compact = compact_param(request.args.get("format"))
+    if error := batch_params_error(locations, kind):
+        return error
+
+    provider = get_provider()
+
+    # tasks get copies of this context, so they report freshness here
+    with cache.track_freshness() as freshness:
+        results = await asyncio.gather(
+            *(
+                _location_weather(provider, location, kind, approximate, compact)
+                for location in locations
+            )
+        )
+
+    body = batch_body(locations, results)
+    if any(isinstance(result, dict) for result in results):
+        return Response(body, mimetype="application/json")
+    return await cached_response(body, freshness)
+
+
+@async_forecast_bp.route("/accu/route")
+async def trip_weather():
+    locations = request.args.getlist("location")
+    if error := locations_params_error(locations):
+        return error
+    try:
+        departure, speed = trips.parse_trip_params(
+            request.args.get("departure"), request.args.get("speed")
+        )
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+    if error := trip_coords_error(locations):
+        return error
+
+    provider = get_provider()
+
+    geos = await asyncio.gather(
+        *(location_parse(location, provider) for location in locations)
+    )
+    if error := trip_geos_error(locations, geos):
+        return error
+
+    try:
+        with cache.track_freshness() as freshness:
+            trip = await trips.AsyncTripPlanner(provider).trip_json(
+                geos, departure, speed
+            )
+    except Exception:
+        log_exception(logger, f"Failed to get weather along {', '.join(locations)}")
+        return {"status": "error", "message": "could not get forecast"}
+
+    return await cached_response(trip, freshness)
+
+
+@async_forecast_bp.route("/geo/complete")
+async def geo_complete():
+    return complete_locations(request.args.get("prefix"), request.args.get("limit"))
+
+
+@async_forecast_bp.route("/stats/cache")
+async def cache_stats():
+    return {"pid": os.getpid(), **cache.stats()}
+
+
+@async_forecast_bp.route("/stats/upstream")
+async def upstream_stats():
+    return {
+        "pid": os.getpid(),
+        **governor.stats(),
+        **(await governor.async_governor.status()),
+    }
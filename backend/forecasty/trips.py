@@ -0,0 +1,265 @@
+import os
+import asyncio
+import contextvars
+
+from typing import NamedTuple
+from pydantic import BaseModel
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from .cache import RAW, cached
+from .cache_async import async_cached
+from .geo import distance_km
+from .api import (
+    Geo,
+    Weather,
+    Forecast,
+    ForecastDelta,
+    ColumnarForecast,
+    _RENDERED_FORECAST_TTL,
+    _RENDER_CALL_SECS,
+)
+
+# Average speed of a trip when it isn't given, km/h
+TRIP_SPEED_KMH = float(os.getenv("TRIP_SPEED_KMH", 60))
+# Departures are rounded down to this step, so trips starting around the same
+# time share cached weather
+TRIP_DEPARTURE_STEP = int(os.getenv("TRIP_DEPARTURE_STEP", 15 * 60))
+TRIP_MAX_SPEED_KMH = 1000
+# Hourly forecasts start at the next full hour, so arrivals since the rounded
+# down departure till then get their first unit
+_FIRST_UNIT_REACH = timedelta(hours=1, seconds=TRIP_DEPARTURE_STEP)
+
+# Forecasts waypoints' weather is taken from and how far ahead they reach.
+# Those are the ones served by routes, so they're likely cached or warmed.
+_TRIP_FORECASTS = (
+    (ForecastDelta.hour, 12, timedelta(hours=12)),
+    (ForecastDelta.day, 5, timedelta(days=5)),
+)
+_TRIP_WORKERS = 8
+
+
+class Waypoint(BaseModel):
+    geo: Geo
+    distance_km: float  # from the first waypoint along the route
+    arrival: str  # string in iso format
+    # forecast at the time of arrival, if it's known
+    weather: Weather | None
+
+
+class Trip(BaseModel):
+    waypoints: list[Waypoint]
+    departure: str  # string in iso format
+    speed_kmh: float
+    # weather at every waypoint is known and favorable
+    favorable: bool
+    # some of the forecasts are served from the last cached data
+    stale: bool = False
+
+
+class Leg(NamedTuple):
+    geo: Geo
+    distance_km: float
+    arrival: datetime
+
+
+def parse_trip_params(departure: str | None, speed: str | None) -> tuple[int, float]:
+    """
+    Returns departure timestamp rounded down to `TRIP_DEPARTURE_STEP` (now by
+    default) and speed in km/h. Raises ValueError with a message for client.
+    """
+
+    try:
+        departure = (
+            datetime.now(timezone.utc)
+            if departure is None
+            else datetime.fromisoformat(departure)
+        )
+    except ValueError:
+        raise ValueError("departure query param must be iso datetime")
+    if departure.tzinfo is None:
+        departure = departure.replace(tzinfo=timezone.utc)
+    try:
+        speed = TRIP_SPEED_KMH if speed is None else float(speed)
+    except ValueError:
+        raise ValueError("speed query param must be a number")
+    if not 0 < speed <= TRIP_MAX_SPEED_KMH:
+        raise ValueError(f"speed must be positive and at most {TRIP_MAX_SPEED_KMH}")
+    timestamp = int(departure.timestamp())
+    return timestamp - timestamp % TRIP_DEPARTURE_STEP, speed
+
+
+def plan_trip(geos: list[Geo], departure: int, speed_kmh: float) -> list[Leg]:
+    """
+    Distances along the route through the locations and times of arrival
+    there, moving straight between them at constant speed.
+    """
+
+    arrival = datetime.fromtimestamp(departure, timezone.utc)
+    legs, distance, previous = [], 0.0, None
+    for geo in geos:
+        if previous is not None:
+            step = distance_km(
+                previous.longitude, previous.latitude, geo.longitude, geo.latitude
+            )
+            distance += step
+            arrival += timedelta(seconds=round(step / speed_kmh * 3600))
+        legs.append(Leg(geo, distance, arrival))
+        previous = geo
+    return legs
+
+
+def forecast_params(arrival: datetime) -> tuple[ForecastDelta, int] | None:
+    """
+    The shortest forecast reaching the time of arrival, if any.
+    """
+
+    ahead = arrival - datetime.now(timezone.utc)
+    for delta, longs, reach in _TRIP_FORECASTS:
+        if ahead <= reach:
+            return delta, longs
+    return None
+
+
+def _unit_matches(date: datetime, delta: ForecastDelta, arrival: datetime) -> bool:
+    if delta == ForecastDelta.day:
+        # daily units are dated by some hour of the day in local time
+        return date.date() == arrival.astimezone(date.tzinfo).date()
+    return abs(date - arrival) <= timedelta(hours=1)
+
+
+def unit_at(
+    forecast: Forecast | ColumnarForecast, delta: ForecastDelta, arrival: datetime
+) -> Weather | None:
+    """
+    Forecast unit closest to the time of arrival. `delta` is what has been
+    asked for, since daily forecasts are parsed into hourly deltas.
+    """
+
+    if isinstance(forecast, ColumnarForecast):
+        dates = forecast.dates
+    else:
+        dates = [unit.date for unit in forecast.units]
+    dates = [datetime.fromisoformat(date) for date in dates]
+    if delta != ForecastDelta.day and dates:
+        if dates[0] - _FIRST_UNIT_REACH <= arrival < dates[0]:
+            arrival = dates[0]
+    found, found_distance = None, None
+    for i, date in enumerate(dates):
+        if not _unit_matches(date, delta, arrival):
+            continue
+        if found is None or abs(date - arrival) < found_distance:
+            found, found_distance = i, abs(date - arrival)
+    if found is None:
+        return None
+    if isinstance(forecast, ColumnarForecast):
+        return forecast.unit(found)
+    return forecast.units[found]
+
+
+def forecast_requests(legs: list[Leg]) -> list[tuple | None]:
+    """
+    Forecast of each leg as (geo, delta, longs), if there's one reaching it.
+    """
+
+    requests = []
+    for leg in legs:
+        params = forecast_params(leg.arrival)
+        requests.append(None if params is None else (leg.geo, *params))
+    return requests
+
+
+def make_trip(
+    legs: list[Leg],
+    requests: list[tuple | None],
+    forecasts: dict[tuple, Forecast | ColumnarForecast | None],
+    departure: int,
+    speed_kmh: float,
+) -> Trip:
+    waypoints = []
+    for leg, request in zip(legs, requests):
+        weather = None
+        if request is not None and (forecast := forecasts[request]) is not None:
+            weather = unit_at(forecast, request[1], leg.arrival)
+        waypoints.append(
+            Waypoint(
+                geo=leg.geo,
+                distance_km=leg.distance_km,
+                arrival=leg.arrival.isoformat(),
+                weather=weather,
+            )
+        )
+    return Trip(
+        waypoints=waypoints,
+        departure=datetime.fromtimestamp(departure, timezone.utc).isoformat(),
+        speed_kmh=speed_kmh,
+        favorable=all(
+            waypoint.weather is not None and waypoint.weather.favorable
+            for waypoint in waypoints
+        ),
+        stale=any(forecast.stale for forecast in forecasts.values() if forecast),
+    )
+
+
+class TripPlanner:
+    """
+    Computes weather along routes with forecasts of the provider. Results are
+    cached by the waypoints, rounded departure and speed. A failed forecast
+    fails the whole trip, so its result isn't cached.
+    """
+
+    def __init__(self, provider):
+        self._provider = provider
+        # shares entries between sync and async variants of the provider
+        self.cache_namespace = getattr(
+            provider, "cache_namespace", type(provider).__qualname__
+        )
+
+    @cached(
+        soft_ttl=_RENDERED_FORECAST_TTL, serializer=RAW, call_secs=_RENDER_CALL_SECS
+    )
+    def trip_json(self, geos: list[Geo], departure: int, speed_kmh: float) -> bytes:
+        legs = plan_trip(geos, departure, speed_kmh)
+        requests = forecast_requests(legs)
+        # each forecast is fetched once, even if the route passes a location
+        # twice
+        unique = list(dict.fromkeys(filter(None, requests)))
+        with ThreadPoolExecutor(max(1, min(len(unique), _TRIP_WORKERS))) as pool:
+            # workers report fallbacks and freshness through copies of this
+            # context
+            contexts = [contextvars.copy_context() for _ in unique]
+            forecasts = list(
+                pool.map(
+                    lambda context, request: context.run(
+                        self._provider.get_forecast, *request
+                    ),
+                    contexts,
+                    unique,
+                )
+            )
+        trip = make_trip(
+            legs, requests, dict(zip(unique, forecasts)), departure, speed_kmh
+        )
+        return trip.model_dump_json().encode("utf-8")
+
+
+class AsyncTripPlanner(TripPlanner):
+    """
+    `TripPlanner` over async provider.
+    """
+
+    @async_cached(
+        soft_ttl=_RENDERED_FORECAST_TTL, serializer=RAW, call_secs=_RENDER_CALL_SECS
+    )
+    async def trip_json(
+        self, geos: list[Geo], departure: int, speed_kmh: float
+    ) -> bytes:
+        legs = plan_trip(geos, departure, speed_kmh)
+        requests = forecast_requests(legs)
+        unique = list(dict.fromkeys(filter(None, requests)))
+        forecasts = await asyncio.gather(
+            *(self._provider.get_forecast(*request) for request in unique)
+        )
+        trip = make_trip(
+            legs, requests, dict(zip(unique, forecasts)), departure, speed_kmh
+        )
+        return trip.model_dump_json().encode("utf-8")
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import logging
+import datetime
+
+from forecasty import cache, governor, popularity
+from forecasty.api import Provider, UpstreamThrottledError
+from forecasty.providers import PROVIDERS, resolve_factory
+
+logger = logging.getLogger(__name__)
+
+# How many of the most popular locations are kept warm
+WARMER_TOP_N = int(os.getenv("WARMER_TOP_N", 20))
+# Cached weather is refreshed this many seconds before it becomes stale
+WARMER_AHEAD = int(os.getenv("WARMER_AHEAD", 120))
+WARMER_INTERVAL = int(os.getenv("WARMER_INTERVAL", 60))
+# Daily limit of api calls (0 disables it) and the share of it the warmer may
+# spend, the rest is left for user requests
+WARMER_DAILY_QUOTA = int(os.getenv("WARMER_DAILY_QUOTA", governor.UPSTREAM_DAILY_QUOTA))
+WARMER_QUOTA_SHARE = float(os.getenv("WARMER_QUOTA_SHARE", 0.2))
+
+_CALLS_KEY_PREFIX = "warmer:calls:"
+
+
+def _calls_key() -> str:
+    # quota is reset daily at midnight UTC
+    return _CALLS_KEY_PREFIX + datetime.datetime.now(datetime.UTC).date().isoformat()
+
+
+def remaining_budget() -> int:
+    if WARMER_DAILY_QUOTA <= 0:
+        return sys.maxsize  # unlimited, as governor's quota
+    spent = int(cache._r.get(_calls_key()) or 0)
+    return int(WARMER_DAILY_QUOTA * WARMER_QUOTA_SHARE) - spent
+
+
+def spend(calls: int):
+    with cache._r.pipeline() as pipe:
+        pipe.incrby(_calls_key(), calls)
+        pipe.expire(_calls_key(), 2 * 24 * 3600)
+        pipe.execute()
+
+
+def warm(provider: Provider) -> int:
+    """
+    Refreshes weather of popular locations within remaining daily budget.
+    Returns number of upstream calls made.
+    """
+
+    calls = 0
+    for geo in popularity.top(WARMER_TOP_N):
+        if (budget := remaining_budget()) <= 0:
+            logger.info("Warmer has spent its share of daily api quota")
+            break
+        try:
+            made = provider.warm(geo, WARMER_AHEAD, budget)
+        except UpstreamThrottledError:
+            logger.info("Upstream calls are throttled, warming is postponed")
+            break
+        except Exception:
+            log_exception(logger, f"Failed to warm {geo.name} weather")
+            continue
+        if made:
+            spend(made)
+            calls += made
+    return calls
+
+
+def run(provider: Provider):
+    last_run = time.monotonic()
+    while True:
+        started = time.monotonic()
+        popularity.decay(started - last_run)
+        last_run = started
+        if calls := warm(provider):
+            logger.info(f"Warmed popular locations with {calls} api calls")
+        time.sleep(max(0.0, WARMER_INTERVAL - (time.monotonic() - started)))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    provider = resolve_factory(None, PROVIDERS)()
+    try:
+        run(provider)
+    finally:
+        provider.close()
@@ -1,5 +1,26 @@
+import logging
 import gunicorn.app.base
 
+from forecasty import cache
+from forecasty.api import _RENDER_CALL_SECS
+from forecasty.keypool import log_exception
+
+logger = logging.getLogger(__name__)
+
+# Workers silent for longer are killed. The slowest request renders a forecast
+# waiting for upstream calls with all their retries, killing it midway would
+# leave its lease held and its fallback and breaker failures unrecorded.
+WORKER_TIMEOUT = _RENDER_CALL_SECS + 10
+
+
+def purge_stale_cache(server):
+    # Runs once in the master before workers start. Entries of older formats
+    # may have no expiration, a failed purge is retried on the next start.
+    try:
+        cache.purge_stale_funcs()
+    except Exception:
+        log_exception(logger, "Failed to purge stale cache entries")
+
 
 class WSGIApplication(gunicorn.app.base.BaseApplication):
     def __init__(self, app, options=None):
@@ -21,7 +42,6 @@ class WSGIApplication(gunicorn.app.base.BaseApplication):
 
 
 if __name__ == "__main__":
-    import logging
     import forecasty
     import multiprocessing
 
@@ -30,11 +50,16 @@ if __name__ == "__main__":
     SERVER_PORT = 5000
     WORKERS = (multiprocessing.cpu_count() * 2) + 1
 
+    app = forecasty.make_app()
+
     WSGIApplication(
-        forecasty.make_app(),
+        app,
         {
             "bind": f"0.0.0.0:{SERVER_PORT}",
             "workers": WORKERS,
             "reload": True,
+            "timeout": WORKER_TIMEOUT,
+            "on_starting": purge_stale_cache,
+            "worker_exit": lambda server, worker: forecasty.providers.close_app(app),
         },
     ).run()
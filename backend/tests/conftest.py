@@ -0,0 +1,17 @@
+import fakeredis
+import pytest
+
+from forecasty import cache
+from forecasty.cache import LocalCache, MemCache
+
+
+@pytest.fixture
+def fake_cache(monkeypatch) -> fakeredis.FakeRedis:
+    """
+    Backs function cache with a fresh fake redis and per-worker cache.
+    """
+
+    r = fakeredis.FakeRedis()
+    monkeypatch.setattr(cache, "_memcache", MemCache(r))
+    monkeypatch.setattr(cache, "_local_cache", LocalCache(1024, 1024 * 1024))
+    return r
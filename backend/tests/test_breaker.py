@@ -0,0 +1,61 @@
+import time
+
+from forecasty.breaker import CircuitBreaker
+
+
+def _open(breaker: CircuitBreaker, failures: int):
+    for _ in range(failures):
+        with breaker.attempt() as allowed:
+            assert allowed
+            breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(max_failures=3, reset_secs=60)
+    _open(breaker, 2)
+    breaker.record_success()
+    _open(breaker, 2)
+    assert breaker.state == "closed"
+
+    _open(breaker, 1)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_trial_call_closes_breaker():
+    breaker = CircuitBreaker(max_failures=1, reset_secs=0.05)
+    _open(breaker, 1)
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+
+    with breaker.attempt() as allowed:
+        assert allowed
+        # only one trial call at a time
+        assert not breaker.allow()
+        breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_trial_reopens_breaker():
+    breaker = CircuitBreaker(max_failures=3, reset_secs=0.05)
+    _open(breaker, 3)
+    time.sleep(0.06)
+
+    _open(breaker, 1)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_trial_without_outcome_lets_next_call_try():
+    breaker = CircuitBreaker(max_failures=1, reset_secs=0.05)
+    _open(breaker, 1)
+    time.sleep(0.06)
+
+    with breaker.attempt() as allowed:
+        assert allowed  # e.g. throttled before reaching upstream
+    assert breaker.state == "half-open"
+    with breaker.attempt() as allowed:
+        assert allowed
+        breaker.record_success()
+    assert breaker.state == "closed"
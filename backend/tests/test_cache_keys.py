@@ -0,0 +1,75 @@
+import os
+import sys
+import subprocess
+
+from pathlib import Path
+from forecasty import api, api_async
+from forecasty.cache import func_key
+
+_BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Prints key of a method call with arguments of every kind cache keys are
+# made of
+_KEY_SCRIPT = """
+from forecasty import api
+from forecasty.cache import func_key
+
+geo = api.Geo(id="294021", name="Москва", longitude=37.6184, latitude=55.7512)
+print(
+    func_key(
+        api.AccuWeather.get_forecast_json.__wrapped__,
+        (api.AccuWeatherBase(), geo, api.ForecastDelta.hour, 12),
+        {"compact": True},
+    )
+)
+"""
+
+
+def _key_in_subprocess(hash_seed: str) -> str:
+    env = {**os.environ, "PYTHONHASHSEED": hash_seed}
+    return subprocess.run(
+        [sys.executable, "-c", _KEY_SCRIPT],
+        cwd=_BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+
+
+def test_key_is_stable_across_processes():
+    keys = {_key_in_subprocess(seed) for seed in ("1", "2", "3")}
+    assert len(keys) == 1
+    assert keys.pop().startswith("func:AccuWeather.get_forecast_json:v")
+
+
+def test_key_binds_arguments_to_signature():
+    def f(a, b=2):
+        pass
+
+    assert func_key(f, (1,), {"b": 2}) == func_key(f, (), {"a": 1, "b": 2})
+    assert func_key(f, (1,), {}) == func_key(f, (1, 2), {})
+    assert func_key(f, (1,), {}) != func_key(f, (1, 3), {})
+
+
+def test_key_of_negative_zero():
+    def f(a):
+        pass
+
+    assert func_key(f, (-0.0,), {}) == func_key(f, (0.0,), {})
+    assert func_key(f, (0.1,), {}) != func_key(f, (0.0,), {})
+
+
+def test_sync_and_async_providers_share_keys():
+    geo = api.Geo(id="1", name="x", longitude=1.0, latitude=2.0)
+    args = (geo, api.ForecastDelta.day, 5)
+    sync_key = func_key(
+        api.AccuWeather._get_forecast.__wrapped__, (api.AccuWeatherBase(), *args), {}
+    )
+    async_key = func_key(
+        api_async.AsyncAccuWeather._get_forecast.__wrapped__,
+        (api_async.AsyncAccuWeather(), *args),
+        {},
+    )
+    assert sync_key == async_key
+    assert sync_key.startswith("func:AccuWeather._get_forecast:")
@@ -0,0 +1,55 @@
+import json
+from array import array
+
+import pytest
+
+from forecasty.api import ColumnarForecast, Forecast, ForecastDelta, Geo
+
+_GEO = Geo(id="294021", name="Москва", longitude=37.6184, latitude=55.7512)
+
+
+def _columnar(longs: int) -> ColumnarForecast:
+    return ColumnarForecast(
+        geo=_GEO,
+        delta=ForecastDelta.hour,
+        dates=[f"2026-10-17T{i:02}:00:00+03:00" for i in range(longs)],
+        descriptions=[f"hour {i}" for i in range(longs)],
+        # around both sides of favorable temperature and wind limits
+        temperature_f=array("d", [-10.5 + 9.3 * i for i in range(longs)]),
+        wind_speed_ms=array("d", [1.5 * i for i in range(longs)]),
+        humidity_percent=array("d", [40 + i for i in range(longs)]),
+        precipitation_probability_percent=array("d", [7 * i for i in range(longs)]),
+    )
+
+
+@pytest.mark.parametrize("longs", [0, 1, 15])
+def test_json_matches_forecast_model(longs):
+    columnar = _columnar(longs)
+    forecast = columnar.to_forecast()
+    assert isinstance(forecast, Forecast)
+    assert columnar.model_dump_json() == forecast.model_dump_json()
+    assert columnar.model_dump() == json.loads(forecast.model_dump_json())
+
+
+def test_units_are_built_from_columns():
+    columnar = _columnar(15)
+    assert columnar.longs == 15
+    assert columnar.geo == _GEO
+    assert columnar.units[3] == columnar.unit(3)
+    assert columnar.units[3].conditions.temperature_c == pytest.approx(
+        (-10.5 + 9.3 * 3 - 32) * 5 / 9
+    )
+    assert [unit.favorable for unit in columnar.units] == columnar.favorable
+    assert True in columnar.favorable and False in columnar.favorable
+
+
+def test_stale_forecast():
+    columnar = _columnar(2)
+    columnar.stale = True
+    assert json.loads(columnar.model_dump_json())["stale"] is True
+    assert columnar.model_dump_json() == columnar.to_forecast().model_dump_json()
+
+
+def test_empty_forecast_has_no_geo():
+    assert _columnar(0).geo is None
+    assert _columnar(0).to_forecast().geo is None
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from forecasty import api
+from forecasty.api import AccuWeather, ForecastDelta, Geo
+
+_GEO = Geo(id="294021", name="Москва", longitude=37.6184, latitude=55.7512)
+_NOW = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _hourly(longs: int, start: datetime = _NOW) -> list:
+    return [
+        {
+            "DateTime": (start + timedelta(hours=i)).isoformat(),
+            "IconPhrase": f"hour {i}",
+            "WetBulbTemperature": {"Value": 50 + i},
+            "Wind": {"Speed": {"Value": 3}},
+            "RelativeHumidity": 60,
+            "PrecipitationProbability": 10,
+        }
+        for i in range(longs)
+    ]
+
+
+def _daily(longs: int) -> dict:
+    return {
+        "Headline": {"Text": "headline"},
+        "DailyForecasts": [
+            {
+                "Date": (_NOW + timedelta(days=i)).isoformat(),
+                "Day": {
+                    "LongPhrase": f"day {i}",
+                    "WetBulbTemperature": {"Average": {"Value": 50 + i}},
+                    "Wind": {"Speed": {"Value": 3}},
+                    "RelativeHumidity": {"Average": 60},
+                    "PrecipitationProbability": 10,
+                },
+            }
+            for i in range(longs)
+        ],
+    }
+
+
+@pytest.fixture
+def provider(fake_cache, monkeypatch) -> AccuWeather:
+    def request(self, url, **params):
+        pytest.fail(f"unexpected upstream call: {url}")
+
+    monkeypatch.setattr(AccuWeather, "_request", request)
+    return AccuWeather(api_key="k")
+
+
+def _cache_forecast(provider, delta: ForecastDelta, longs: int, data):
+    # upstream call of the longer forecast made by another request
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(AccuWeather, "_request", lambda self, url, **_: data)
+        provider._get_forecast(_GEO, delta, longs)
+
+
+def test_cut_forecast():
+    provider = api.AccuWeatherBase()
+    assert provider._cut_forecast(_hourly(24), ForecastDelta.hour, 12) == _hourly(12)
+    daily = provider._cut_forecast(_daily(10), ForecastDelta.day, 5)
+    assert daily == {**_daily(10), "DailyForecasts": _daily(5)["DailyForecasts"]}
+
+
+def test_forecast_is_cut_from_cached_longer_one(provider):
+    _cache_forecast(provider, ForecastDelta.hour, 24, _hourly(24))
+    forecast = provider.get_forecast(_GEO, ForecastDelta.hour, 12)
+    assert forecast.longs == 12
+    assert forecast.descriptions == [f"hour {i}" for i in range(12)]
+
+    _cache_forecast(provider, ForecastDelta.day, 10, _daily(10))
+    forecast = provider.get_forecast(_GEO, ForecastDelta.day, 5)
+    assert forecast.descriptions == [f"day {i}" for i in range(5)]
+
+
+def test_approximate_conditions_from_cached_forecast(provider):
+    _cache_forecast(provider, ForecastDelta.hour, 12, _hourly(12, _NOW))
+    weather = provider.get_conditions(_GEO, approximate=True)
+    assert weather.approximate
+    assert weather.description in ("hour 0", "hour 1")
+    assert weather.geo == _GEO
+
+
+def test_approximate_conditions_need_current_hour():
+    provider = api.AccuWeatherBase()
+    weather = provider._approximate_conditions(_hourly(12), _GEO)
+    assert weather.approximate
+    # forecast starting hours later has no unit of the current hour
+    assert (
+        provider._approximate_conditions(_hourly(12, _NOW + timedelta(hours=3)), _GEO)
+        is None
+    )
+    assert provider._approximate_conditions([], _GEO) is None
+
+
+def test_conditions_are_requested_without_cached_forecast(provider, monkeypatch):
+    observed = [
+        {
+            "LocalObservationDateTime": _NOW.isoformat(),
+            "WeatherText": "observed",
+            "Temperature": {"Imperial": {"Value": 50}},
+            "Wind": {"Speed": {"Imperial": {"Value": 5}}},
+            "RelativeHumidity": 60,
+            "HasPrecipitation": False,
+        }
+    ]
+    monkeypatch.setattr(AccuWeather, "_request", lambda self, url, **_: observed)
+    weather = provider.get_conditions(_GEO, approximate=True)
+    assert not weather.approximate
+    assert weather.description == "observed"
@@ -0,0 +1,68 @@
+import fakeredis
+import pytest
+
+from forecasty.cache import (
+    _FUNC_ENTRY_FIELDS,
+    FuncCacheEntry,
+    MemCache,
+    decode_func_entry,
+    encode_func_entry,
+    func_key,
+)
+
+
+def _fields(entry: FuncCacheEntry, compress_min_bytes: int = 0) -> list:
+    encoded = encode_func_entry(entry, compress_min_bytes)
+    return [encoded.get(field) for field in _FUNC_ENTRY_FIELDS]
+
+
+@pytest.mark.parametrize(
+    "entry",
+    [
+        FuncCacheEntry(100, b'{"a": 1}'),
+        FuncCacheEntry(100, b'{"a": 1}', modified=90, stale_at=400),
+        FuncCacheEntry(100, b"[" + b"1, " * 1000 + b"1]"),
+    ],
+)
+@pytest.mark.parametrize("compress_min_bytes", [0, 16])
+def test_entry_round_trip(entry, compress_min_bytes):
+    assert decode_func_entry(*_fields(entry, compress_min_bytes)) == entry
+
+
+def test_large_outputs_are_compressed():
+    entry = FuncCacheEntry(100, b"[" + b"1, " * 1000 + b"1]")
+    assert encode_func_entry(entry, 4096)["codec"] == b"json"
+    compressed = encode_func_entry(entry, 1024)
+    assert compressed["codec"] == b"json+zlib"
+    assert len(compressed["output"]) < len(entry.output)
+
+
+def test_missing_entry():
+    assert decode_func_entry(None, None, None) is None
+
+
+def test_entry_round_trip_through_redis():
+    memcache = MemCache(fakeredis.FakeRedis(), compress_min_bytes=16)
+    entry = FuncCacheEntry(100, b"[" + b"1, " * 100 + b"1]", modified=90, stale_at=400)
+    memcache.cache_func("func:f:v2:abc", entry, ttl=60)
+    assert memcache.get_func("func:f:v2:abc") == entry
+    assert memcache.get_func("func:f:v2:missing") is None
+
+
+def test_purge_stale_funcs():
+    r = fakeredis.FakeRedis()
+    memcache = MemCache(r)
+
+    def f(a):
+        pass
+
+    current = func_key(f, (1,), {})
+    memcache.cache_func(current, FuncCacheEntry(100, b"1"))
+    # legacy json dump under salted hash and entry of older key version
+    r.set("func:f:-123456789", '{"timestamp": 100, "output": "1"}')
+    r.hset("func:f:v1:abc", mapping={"timestamp": 100, "output": b"1"})
+    r.set("other:key", 1)
+
+    assert memcache.purge_stale_funcs(batch=1) == 2
+    assert sorted(r.scan_iter("*")) == sorted([current.encode(), b"other:key"])
+    assert memcache.purge_stale_funcs() == 0
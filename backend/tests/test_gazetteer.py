@@ -0,0 +1,49 @@
+from forecasty.gazetteer import Gazetteer, GazetteerEntry
+
+_ROWS = [
+    ("294021", "Москва", 37.6184, 55.7512, ["Moscow"]),
+    ("295212", "Санкт-Петербург", 30.3141, 59.9386, ["Питер", "Saint Petersburg"]),
+    ("294199", "Тверь", 35.9119, 56.8587, []),
+    ("293686", "Мосальск", 34.9828, 54.4953, []),
+]
+
+_MOSCOW = GazetteerEntry("294021", "Москва", 37.6184, 55.7512)
+_MOSALSK = GazetteerEntry("293686", "Мосальск", 34.9828, 54.4953)
+
+
+def test_lookup_by_name_and_alias():
+    gazetteer = Gazetteer(_ROWS)
+    assert len(gazetteer) == 4
+    assert gazetteer.lookup("москва") == _MOSCOW
+    assert gazetteer.lookup("  MOSCOW ") == _MOSCOW
+    assert gazetteer.lookup("питер").id == "295212"
+    assert gazetteer.lookup("моск") is None
+    assert Gazetteer([]).lookup("москва") is None
+
+
+def test_complete_prefix():
+    gazetteer = Gazetteer(_ROWS)
+    assert gazetteer.complete("мос") == [_MOSALSK, _MOSCOW]
+    assert gazetteer.complete("мос", limit=1) == [_MOSALSK]
+    assert gazetteer.complete("sAINT")[0].id == "295212"
+    assert gazetteer.complete("   ") == []
+
+
+def test_complete_misspelled_names():
+    gazetteer = Gazetteer(_ROWS)
+    assert gazetteer.complete("масква")[0] == _MOSCOW
+    assert gazetteer.complete("тварь")[0].id == "294199"
+    assert gazetteer.complete("qwerty") == []
+
+
+def test_load_csv(tmp_path):
+    path = tmp_path / "gazetteer.csv"
+    path.write_text(
+        "key,name,longitude,latitude,aliases\n"
+        "294021,Москва,37.6184,55.7512,Moscow|Мск\n"
+        "294199,Тверь,35.9119,56.8587\n",
+        encoding="utf-8",
+    )
+    gazetteer = Gazetteer.load(str(path))
+    assert gazetteer.lookup("мск") == _MOSCOW
+    assert gazetteer.lookup("тверь").id == "294199"
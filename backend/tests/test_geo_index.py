@@ -0,0 +1,67 @@
+import time
+import asyncio
+
+import fakeredis
+
+from forecasty import geo
+from forecasty.geo import (
+    AsyncGeoIndex,
+    GeoIndex,
+    _miss_key,
+    geo_query,
+    normalize_search_string,
+    snap_coordinate,
+)
+
+_MOSCOW = b'{"id": "294021", "longitude": 37.6184, "latitude": 55.7512}'
+
+
+def test_normalized_spellings_share_query():
+    assert normalize_search_string("  Нижний\tНовгород ") == "нижний новгород"
+    assert normalize_search_string("ＭＯＳＣＯＷ") == "moscow"
+
+
+def test_coordinates_are_snapped():
+    assert snap_coordinate(55.7512) == 55.75
+    assert snap_coordinate(37.6184) == 37.62
+    assert geo_query(None, longitude=37.62, latitude=55.75) == "55.75,37.62"
+    assert geo_query("moscow", None, None) == "moscow"
+
+
+def test_resolved_location_is_remembered():
+    r = fakeredis.FakeRedis()
+    GeoIndex(r).remember("moscow", _MOSCOW)
+    # other worker finds it in redis, then in its local cache
+    index = GeoIndex(r)
+    assert index.lookup("moscow") == (True, _MOSCOW)
+    r.flushall()
+    assert index.lookup("moscow") == (True, _MOSCOW)
+
+
+def test_miss_expires_after_ttl(monkeypatch):
+    monkeypatch.setattr(geo, "GEO_MISS_TTL", 60)
+    r = fakeredis.FakeRedis()
+    index = GeoIndex(r)
+    assert index.lookup("mosow") == (False, None)
+
+    index.remember("mosow", None)
+    assert index.lookup("mosow") == (True, None)
+    assert 0 < r.ttl(_miss_key("mosow")) <= 60
+
+    r.pexpire(_miss_key("mosow"), 1)
+    time.sleep(0.01)
+    assert index.lookup("mosow") == (False, None)
+
+
+def test_async_index_shares_data_with_sync_one(monkeypatch):
+    monkeypatch.setattr(geo, "GEO_MISS_TTL", 60)
+    server = fakeredis.FakeServer()
+    GeoIndex(fakeredis.FakeRedis(server=server)).remember("moscow", _MOSCOW)
+
+    async def lookups():
+        index = AsyncGeoIndex(fakeredis.FakeAsyncRedis(server=server))
+        await index.remember("mosow", None)
+        return await index.lookup("moscow"), await index.lookup("mosow")
+
+    assert asyncio.run(lookups()) == ((True, _MOSCOW), (True, None))
+    assert GeoIndex(fakeredis.FakeRedis(server=server)).lookup("mosow") == (True, None)
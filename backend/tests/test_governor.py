@@ -0,0 +1,62 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from forecasty import cache, governor
+from forecasty.governor import AsyncGovernor, Governor
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    # a burst of 4 calls, refilled slowly enough to never refill within a test
+    monkeypatch.setattr(governor, "UPSTREAM_RATE", 0.001)
+    monkeypatch.setattr(governor, "UPSTREAM_BURST", 4)
+    monkeypatch.setattr(governor, "UPSTREAM_DAILY_QUOTA", 10)
+    monkeypatch.setattr(governor, "UPSTREAM_BACKGROUND_RESERVE", 0.5)
+    monkeypatch.setattr(governor, "UPSTREAM_MAX_WAIT", 0)
+
+
+def _in_background(func):
+    token = cache._background.set(True)
+    try:
+        return func()
+    finally:
+        cache._background.reset(token)
+
+
+def test_burst_is_limited(limits):
+    limiter = Governor(fakeredis.FakeRedis())
+    assert [limiter.acquire() for _ in range(5)] == [True] * 4 + [False]
+    assert limiter.status() == {
+        "daily_quota": 10,
+        "daily_spent": 4,
+        "daily_remaining": 6,
+    }
+
+
+def test_daily_quota_is_limited(limits, monkeypatch):
+    monkeypatch.setattr(governor, "UPSTREAM_BURST", 100)
+    limiter = Governor(fakeredis.FakeRedis())
+    assert sum(limiter.acquire() for _ in range(12)) == 10
+    assert limiter.status()["daily_remaining"] == 0
+
+
+def test_background_calls_leave_reserve(limits):
+    limiter = Governor(fakeredis.FakeRedis())
+    # background calls can't take the last half of the burst
+    assert [_in_background(limiter.acquire) for _ in range(3)] == [True] * 2 + [False]
+    assert [limiter.acquire() for _ in range(3)] == [True] * 2 + [False]
+
+
+def test_limits_are_shared_by_workers(limits):
+    server = fakeredis.FakeServer()
+    limiter = Governor(fakeredis.FakeRedis(server=server))
+    async_limiter = AsyncGovernor(fakeredis.FakeAsyncRedis(server=server))
+
+    async def acquire_all():
+        return [await async_limiter.acquire() for _ in range(3)]
+
+    assert limiter.acquire()
+    assert asyncio.run(acquire_all()) == [True] * 3
+    assert not limiter.acquire()
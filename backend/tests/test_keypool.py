@@ -0,0 +1,69 @@
+import asyncio
+
+import fakeredis
+
+from forecasty.keypool import (
+    AsyncKeyPool,
+    KeyPool,
+    configured_keys,
+    describe_error,
+    key_id,
+    redact,
+)
+
+
+def test_calls_are_spread_over_keys():
+    pool = KeyPool(fakeredis.FakeRedis(), ["k1", "k2", "k3"])
+    chosen = []
+    for _ in range(6):
+        chosen.append(api_key := pool.choose())
+        pool.record(api_key)
+    assert sorted(chosen) == ["k1", "k1", "k2", "k2", "k3", "k3"]
+
+
+def test_exhausted_keys_are_rotated():
+    server = fakeredis.FakeServer()
+    pool = KeyPool(fakeredis.FakeRedis(server=server), ["k1", "k2"])
+    pool.record("k2")
+    assert pool.choose() == "k1"
+
+    pool.exhaust("k1")
+    assert pool.choose() == "k2"
+    # other workers skip it too
+    other = KeyPool(fakeredis.FakeRedis(server=server), ["k1", "k2"])
+    assert other.choose() == "k2"
+
+    pool.exhaust("k2")
+    assert pool.choose() is None
+
+
+def test_async_pool_shares_usage():
+    server = fakeredis.FakeServer()
+    KeyPool(fakeredis.FakeRedis(server=server), ["k1", "k2"]).exhaust("k1")
+
+    async def choose():
+        pool = AsyncKeyPool(fakeredis.FakeAsyncRedis(server=server), ["k1", "k2"])
+        await pool.record("k2")
+        return await pool.choose()
+
+    assert asyncio.run(choose()) == "k2"
+
+
+def test_configured_keys(monkeypatch):
+    monkeypatch.setenv("API_KEYS", " k1, k2,,")
+    assert configured_keys() == ["k1", "k2"]
+    assert configured_keys("k3") == ["k3"]
+    monkeypatch.delenv("API_KEYS")
+    monkeypatch.setenv("API_KEY", "k4")
+    assert configured_keys() == ["k4"]
+
+
+def test_keys_are_redacted():
+    text = "url: /currentconditions/v1/1?apikey=SECRET&language=ru-ru)"
+    assert redact(text) == (
+        f"url: /currentconditions/v1/1?apikey={key_id('SECRET')}&language=ru-ru)"
+    )
+    error = ValueError("Bad request for url: http://x/v1/1?apikey=SECRET&details=true")
+    assert describe_error(error) == "ValueError: Bad request for url: http://x/v1/1"
+    assert describe_error(ValueError("what? no")) == "ValueError: what? no"
+    assert describe_error(TimeoutError()) == "TimeoutError"
@@ -0,0 +1,52 @@
+from forecasty.cache import LocalCache
+
+
+def test_evicts_least_recently_used_by_size():
+    local = LocalCache(max_entries=10, max_bytes=100)
+    local.put("a", 1, "A", 40)
+    local.put("b", 2, "B", 40)
+    assert local.get("a") == (1, "A")
+
+    local.put("c", 3, "C", 40)
+    assert local.get("b") is None
+    assert local.get("a") == (1, "A")
+    assert local.get("c") == (3, "C")
+
+
+def test_evicts_by_number_of_entries():
+    local = LocalCache(max_entries=2, max_bytes=100)
+    for key in "abc":
+        local.put(key, 0, key, 1)
+    assert local.get("a") is None
+    assert local.get("b") == (0, "b")
+    assert local.get("c") == (0, "c")
+
+
+def test_skips_outputs_larger_than_the_whole_cache():
+    local = LocalCache(max_entries=10, max_bytes=100)
+    local.put("a", 0, "A", 60)
+    local.put("b", 0, "B", 101)
+    assert local.get("b") is None
+    assert local.get("a") == (0, "A")
+
+
+def test_replacing_entry_frees_its_size():
+    local = LocalCache(max_entries=10, max_bytes=100)
+    local.put("a", 0, "A", 60)
+    local.put("a", 1, "A2", 30)
+    local.put("b", 0, "B", 70)
+    assert local.get("a") == (1, "A2")
+    assert local.get("b") == (0, "B")
+
+    local.erase("a")
+    local.put("c", 0, "C", 30)
+    assert local.get("a") is None
+    assert local.get("b") == (0, "B")
+    assert local.get("c") == (0, "C")
+
+
+def test_disabled_cache_keeps_nothing():
+    local = LocalCache(max_entries=0, max_bytes=100)
+    assert not local.enabled
+    local.put("a", 0, "A", 1)
+    assert local.get("a") is None
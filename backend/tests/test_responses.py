@@ -0,0 +1,83 @@
+import gzip
+import json
+from array import array
+
+import brotli
+import flask
+import pytest
+
+from forecasty import responses
+from forecasty.api import ColumnarForecast, ForecastDelta, Geo
+
+_GEO = Geo(id="294021", name="Москва", longitude=37.6184, latitude=55.7512)
+
+
+def _columnar(longs: int) -> ColumnarForecast:
+    return ColumnarForecast(
+        geo=_GEO,
+        delta=ForecastDelta.day,
+        dates=[f"2026-10-{17 + i}T07:00:00+03:00" for i in range(longs)],
+        descriptions=[f"day {i}" for i in range(longs)],
+        temperature_f=array("d", [20.5 + 10 * i for i in range(longs)]),
+        wind_speed_ms=array("d", [2.5 * i for i in range(longs)]),
+        humidity_percent=array("d", [50 + i for i in range(longs)]),
+        precipitation_probability_percent=array("d", [9 * i for i in range(longs)]),
+    )
+
+
+@pytest.mark.parametrize("longs", [0, 1, 5])
+def test_compact_json_matches_forecast_model(longs):
+    columnar = _columnar(longs)
+    forecast = columnar.to_forecast()
+    assert columnar.compact_json() == forecast.compact_json()
+
+    compact = json.loads(columnar.compact_json())
+    assert compact["dates"] == columnar.dates
+    assert compact["favorable"] == [unit.favorable for unit in forecast.units]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(responses, "COMPRESS_MIN_BYTES", 100)
+    app = flask.Flask(__name__)
+    responses.init_app(app)
+
+    @app.route("/json/<int:size>")
+    def json_route(size):
+        return {"status": "ok", "text": "погода " * size}
+
+    @app.route("/text")
+    def text_route():
+        return "погода " * 100
+
+    return app.test_client()
+
+
+def test_json_is_rendered_with_keys_in_order(client):
+    body = client.get("/json/1").data
+    assert body == '{"status":"ok","text":"погода "}'.encode()
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, encoding, decompress",
+    [
+        ("gzip, br", "br", brotli.decompress),
+        ("gzip;q=1, br;q=0.5", "gzip", gzip.decompress),
+        ("gzip", "gzip", gzip.decompress),
+    ],
+)
+def test_large_json_is_compressed(client, accept_encoding, encoding, decompress):
+    response = client.get("/json/100", headers={"Accept-Encoding": accept_encoding})
+    assert response.headers["Content-Encoding"] == encoding
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert json.loads(decompress(response.data))["text"] == "погода " * 100
+
+
+def test_small_or_unaccepted_bodies_are_sent_as_they_are(client):
+    small = client.get("/json/1", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+    unaccepted = client.get("/json/100", headers={"Accept-Encoding": "deflate"})
+    assert "Content-Encoding" not in unaccepted.headers
+    assert json.loads(unaccepted.data)["status"] == "ok"
+    text = client.get("/text", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in text.headers
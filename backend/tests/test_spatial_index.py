@@ -0,0 +1,90 @@
+import json
+import math
+import random
+
+import fakeredis
+
+from forecasty import geo
+from forecasty.geo import GeoIndex, SpatialIndex, distance_km
+
+
+def _geo(key: str, longitude: float, latitude: float) -> bytes:
+    return json.dumps(
+        {"id": key, "longitude": longitude, "latitude": latitude}
+    ).encode()
+
+
+def _brute_force_nearest(locations, longitude, latitude, radius_km):
+    distances = [
+        (distance_km(longitude, latitude, g["longitude"], g["latitude"]), g["id"])
+        for g in locations
+    ]
+    distance, key = min(distances)
+    return key if distance <= radius_km else None
+
+
+def test_distance():
+    # Moscow to Saint Petersburg
+    assert 630 < distance_km(37.6184, 55.7512, 30.3141, 59.9386) < 640
+    assert distance_km(10, 20, 10, 20) == 0
+
+
+def test_nearest_matches_brute_force():
+    rand = random.Random(1)
+    for radius_km in (3, 50):
+        spatial = SpatialIndex(radius_km)
+        # clusters a few radii across, up to polar latitudes where one cell
+        # spans many degrees of longitude
+        spread = 3 * radius_km / 111
+
+        def near(longitude, latitude):
+            latitude = max(-89.9, min(89.9, latitude + rand.uniform(-spread, spread)))
+            stretch = 1 / max(math.cos(math.radians(latitude)), 0.01)
+            return longitude + rand.uniform(-spread, spread) * stretch, latitude
+
+        locations = []
+        for i in range(300):
+            center = rand.uniform(-170, 170), rand.uniform(-89, 89)
+            for j in range(4):
+                longitude, latitude = near(*center)
+                locations.append(
+                    {"id": f"{i}.{j}", "longitude": longitude, "latitude": latitude}
+                )
+        for location in locations:
+            spatial.insert(json.dumps(location).encode())
+        assert len(spatial) == len(locations)
+
+        found_count = 0
+        for _ in range(300):
+            location = rand.choice(locations)
+            longitude, latitude = near(location["longitude"], location["latitude"])
+            found = spatial.nearest(longitude, latitude)
+            expected = _brute_force_nearest(locations, longitude, latitude, radius_km)
+            assert (found and json.loads(found)["id"]) == expected
+            found_count += found is not None
+        # both hits and misses are checked
+        assert 0 < found_count < 300
+
+
+def test_insert_skips_known_locations():
+    spatial = SpatialIndex(3)
+    spatial.insert(_geo("1", 37.6, 55.75))
+    spatial.insert(_geo("1", 37.6, 55.75))
+    assert len(spatial) == 1
+
+
+def test_nearest_finds_locations_resolved_by_other_workers(monkeypatch):
+    monkeypatch.setattr(geo, "GEO_NEAREST_KM", 3)
+    monkeypatch.setattr(geo, "GEO_SPATIAL_RELOAD_SECS", 600)
+    server = fakeredis.FakeServer()
+    index = GeoIndex(fakeredis.FakeRedis(server=server))
+    other = GeoIndex(fakeredis.FakeRedis(server=server))
+    moscow = _geo("294021", 37.6184, 55.7512)
+
+    assert index.nearest(37.62, 55.75) is None
+    other.remember("55.75,37.62", moscow)
+    assert index.nearest(37.62, 55.75) is None
+
+    index._spatial_loaded_at -= 600
+    assert index.nearest(37.62, 55.75) == moscow
+    assert index.nearest(37.9, 55.75) is None
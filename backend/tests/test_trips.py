@@ -0,0 +1,152 @@
+import json
+from array import array
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from forecasty import trips
+from forecasty.api import ColumnarForecast, ForecastDelta, Geo
+from forecasty.routes import trip_coords_error
+from forecasty.trips import TripPlanner, parse_trip_params, plan_trip, unit_at
+
+_MOSCOW = Geo(id="294021", name="Москва", longitude=37.6184, latitude=55.7512)
+_TVER = Geo(id="294199", name="Тверь", longitude=35.9119, latitude=56.8587)
+_MSK = timezone(timedelta(hours=3))
+# forecasts are dated by local time of the location
+_HOUR = datetime(2026, 10, 17, 12, tzinfo=_MSK)
+
+
+def _forecast(
+    geo: Geo, delta: ForecastDelta, dates: list[datetime], temperature_f: float = 60
+) -> ColumnarForecast:
+    longs = len(dates)
+    return ColumnarForecast(
+        geo=geo,
+        delta=delta,
+        dates=[date.isoformat() for date in dates],
+        descriptions=[date.isoformat() for date in dates],
+        temperature_f=array("d", [temperature_f] * longs),
+        wind_speed_ms=array("d", [2] * longs),
+        humidity_percent=array("d", [50] * longs),
+        precipitation_probability_percent=array("d", [10] * longs),
+    )
+
+
+def _hourly(start: datetime, longs: int = 12, **kwargs) -> ColumnarForecast:
+    dates = [start + timedelta(hours=i) for i in range(longs)]
+    return _forecast(_MOSCOW, ForecastDelta.hour, dates, **kwargs)
+
+
+def test_plan_trip():
+    departure = int(_HOUR.timestamp())
+    legs = plan_trip([_MOSCOW, _TVER, _MOSCOW], departure, 80)
+    assert [leg.geo for leg in legs] == [_MOSCOW, _TVER, _MOSCOW]
+    assert legs[0].distance_km == 0
+    assert legs[0].arrival == _HOUR
+    # ~160 km between the cities
+    assert 155 < legs[1].distance_km < 165
+    assert legs[2].distance_km == pytest.approx(2 * legs[1].distance_km)
+    hours = legs[1].distance_km / 80
+    assert legs[1].arrival - _HOUR == timedelta(seconds=round(hours * 3600))
+
+
+def test_unit_at_closest_hour():
+    forecast = _hourly(_HOUR)
+    arrival = _HOUR + timedelta(hours=2, minutes=40)
+    assert unit_at(forecast, ForecastDelta.hour, arrival).date == (
+        (_HOUR + timedelta(hours=3)).isoformat()
+    )
+    # model forecast gives the same unit as the columnar one
+    assert unit_at(forecast.to_forecast(), ForecastDelta.hour, arrival) == unit_at(
+        forecast, ForecastDelta.hour, arrival
+    )
+    beyond = _HOUR + timedelta(hours=13, minutes=1)
+    assert unit_at(forecast, ForecastDelta.hour, beyond) is None
+
+
+def test_unit_at_departure_before_first_hour():
+    # hourly forecast starts at the next full hour after rounded departure
+    forecast = _hourly(_HOUR)
+    departure = _HOUR - trips._FIRST_UNIT_REACH
+    assert unit_at(forecast, ForecastDelta.hour, departure).date == _HOUR.isoformat()
+    earlier = departure - timedelta(seconds=1)
+    assert unit_at(forecast, ForecastDelta.hour, earlier) is None
+
+
+def test_unit_at_day_of_arrival():
+    days = [_HOUR.replace(hour=7) + timedelta(days=i) for i in range(5)]
+    forecast = _forecast(_MOSCOW, ForecastDelta.hour, days)
+    # late evening in UTC is the next day in Moscow
+    arrival = datetime(2026, 10, 18, 22, tzinfo=timezone.utc)
+    assert unit_at(forecast, ForecastDelta.day, arrival).date == days[2].isoformat()
+    assert unit_at(forecast, ForecastDelta.day, arrival + timedelta(days=5)) is None
+
+
+def test_parse_trip_params():
+    departure, speed = parse_trip_params("2026-10-17T12:20:00+03:00", "80")
+    assert departure == int(_HOUR.replace(minute=15).timestamp())
+    assert speed == 80
+    assert parse_trip_params("2026-10-17T09:00:00", None) == (
+        int(datetime(2026, 10, 17, 9, tzinfo=timezone.utc).timestamp()),
+        trips.TRIP_SPEED_KMH,
+    )
+    for departure, speed in (("tomorrow", None), (None, "fast"), (None, "0")):
+        with pytest.raises(ValueError):
+            parse_trip_params(departure, speed)
+
+
+def test_malformed_coordinates_are_rejected():
+    assert trip_coords_error(["55.75,37.62", "Москва", "Санкт-Петербург"]) is None
+    error = trip_coords_error(["55.75,37.62", "foo,bar", "1,2,3"])
+    assert error == {"status": "error", "message": "could not parse locations: foo,bar"}
+
+
+class _Provider:
+    cache_namespace = "Test"
+
+    def __init__(self, forecasts: dict):
+        self.forecasts = forecasts
+        self.requests = []
+
+    def get_forecast(self, geo, delta, longs):
+        self.requests.append((geo.id, delta, longs))
+        return self.forecasts.get((geo.id, delta))
+
+
+def test_trip_weather(fake_cache):
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    departure = int(now.timestamp())
+    provider = _Provider(
+        {
+            ("294021", ForecastDelta.hour): _hourly(now + timedelta(hours=1)),
+            ("294199", ForecastDelta.hour): _forecast(
+                _TVER,
+                ForecastDelta.hour,
+                [now + timedelta(hours=i) for i in range(1, 13)],
+                temperature_f=100,
+            ),
+        }
+    )
+    trip = json.loads(
+        TripPlanner(provider).trip_json([_MOSCOW, _TVER, _MOSCOW], departure, 80)
+    )
+    waypoints = trip["waypoints"]
+    assert [waypoint["geo"]["id"] for waypoint in waypoints] == [
+        "294021",
+        "294199",
+        "294021",
+    ]
+    assert all(waypoint["weather"] for waypoint in waypoints)
+    # hot weather in Tver
+    assert not waypoints[1]["weather"]["favorable"]
+    assert not trip["favorable"]
+    # Moscow forecast is fetched once for both visits
+    assert sorted(provider.requests) == [
+        ("294021", ForecastDelta.hour, 12),
+        ("294199", ForecastDelta.hour, 12),
+    ]
+
+    # the trip is cached
+    provider.requests.clear()
+    TripPlanner(provider).trip_json([_MOSCOW, _TVER, _MOSCOW], departure, 80)
+    assert provider.requests == []
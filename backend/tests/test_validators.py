@@ -0,0 +1,84 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import flask
+import pytest
+
+from forecasty import cache
+from forecasty.cache import Freshness, cached, track_freshness
+from forecasty.routes import cached_response
+
+_NOW = 1_800_000_000
+
+
+@pytest.fixture
+def now(monkeypatch):
+    monkeypatch.setattr(cache, "_now_timestamp", lambda: _NOW)
+
+
+def test_freshness_of_several_outputs(now):
+    freshness = Freshness([(_NOW - 100, _NOW + 500), (_NOW - 50, _NOW + 300)])
+    assert freshness.timestamp == _NOW - 50
+    assert freshness.stale_at == _NOW + 300
+    assert freshness.max_age() == 300
+
+    assert Freshness([(_NOW - 900, _NOW - 300)]).max_age() == 0
+    assert Freshness().max_age() == 0
+    assert Freshness().timestamp is None
+
+
+def test_cached_outputs_report_freshness(fake_cache, now):
+    @cached(soft_ttl=60)
+    def f(a):
+        return {"a": a}
+
+    with track_freshness() as outer:
+        with track_freshness() as inner:
+            assert f(1) == {"a": 1}
+        # served from per-worker cache this time
+        assert f(1) == {"a": 1}
+    assert inner == [(_NOW, _NOW + 60)]
+    assert outer == [(_NOW, _NOW + 60)] * 2
+
+
+@pytest.fixture
+def client(now):
+    app = flask.Flask(__name__)
+
+    @app.route("/weather")
+    def weather():
+        freshness = Freshness([(_NOW - 100, _NOW + 500), (_NOW - 50, _NOW + 300)])
+        return cached_response(b'{"status": "ok"}', freshness)
+
+    return app.test_client()
+
+
+def test_validators_are_set(client):
+    response = client.get("/weather")
+    assert response.status_code == 200
+    assert response.headers["ETag"].startswith('W/"')
+    assert response.cache_control.public
+    assert response.cache_control.max_age == 300
+    assert response.last_modified == datetime.fromtimestamp(_NOW - 50, timezone.utc)
+
+
+def test_matching_etag_is_not_modified(client):
+    etag = client.get("/weather").headers["ETag"]
+    response = client.get("/weather", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    other = client.get("/weather", headers={"If-None-Match": 'W/"other"'})
+    assert other.status_code == 200
+
+
+def test_not_modified_since(client):
+    since = datetime.fromtimestamp(_NOW - 50, timezone.utc)
+    response = client.get(
+        "/weather", headers={"If-Modified-Since": format_datetime(since, usegmt=True)}
+    )
+    assert response.status_code == 304
+    earlier = datetime.fromtimestamp(_NOW - 51, timezone.utc)
+    response = client.get(
+        "/weather", headers={"If-Modified-Since": format_datetime(earlier, usegmt=True)}
+    )
+    assert response.status_code == 200
@@ -15,6 +15,15 @@ from aiogram.fsm.state import State, StatesGroup
 
 API_URL = "http://forecasty-backend:5000"
 
+# Сколько запросов к бэкенду выполнять одновременно
+MAX_PARALLEL_REQUESTS = 8
+REQUEST_TIMEOUT = httpx.Timeout(30, connect=3.05)
+
+# Последние прогнозы бэкенда с их ETag: если прогноз не изменился, бэкенд
+# отвечает 304 без тела, и берётся сохранённый прогноз
+MAX_CACHED_FORECASTS = 256
+cached_forecasts = {}
+
 logging.basicConfig(level=logging.INFO)
 
 bot = Bot(os.getenv("BOT_TOKEN"))
@@ -56,7 +65,12 @@ def choose_forecast_keyboard():
             types.InlineKeyboardButton(
                 text="12 часов", callback_data="forecast_12hours_12 часов"
             ),
-        ]
+        ],
+        [
+            types.InlineKeyboardButton(
+                text="В пути, если выехать сейчас", callback_data="trip"
+            )
+        ],
     ]
     keyboard = types.InlineKeyboardMarkup(inline_keyboard=buttons)
     return keyboard
@@ -85,16 +99,54 @@ async def choose_weather_period(message: types.Message, state: FSMContext):
     await state.set_state(WeatherState.choosing_period)
 
 
-async def request_forecast(point: str, period: str) -> dict | None:
-    async with httpx.AsyncClient() as client:
+async def request_forecast(
+    client: httpx.AsyncClient, point: str, period: str
+) -> dict | None:
+    cached = cached_forecasts.get((point, period))
+    try:
         response = await client.get(
-            f"{API_URL}/accu/forecast/{period}", params={"location": point}
+            f"{API_URL}/accu/forecast/{period}",
+            # компактный прогноз: город один раз, погода разложена по колонкам
+            params={"location": point, "format": "compact"},
+            headers={"If-None-Match": cached[0]} if cached else {},
         )
-        try:
-            if response.status_code == 200 and response.text.find("error") == -1:
-                return json.loads(response.text)
-        except httpx.RequestError:
-            pass
+        if response.status_code == 304 and cached:
+            return cached[1]
+        if response.status_code == 200 and response.text.find("error") == -1:
+            forecast = json.loads(response.text)
+            if etag := response.headers.get("ETag"):
+                cached_forecasts.pop((point, period), None)
+                cached_forecasts[(point, period)] = (etag, forecast)
+                if len(cached_forecasts) > MAX_CACHED_FORECASTS:
+                    # словарь хранит порядок добавления, первым идёт самый старый
+                    del cached_forecasts[next(iter(cached_forecasts))]
+            return forecast
+    except httpx.RequestError:
+        pass
+
+
+async def request_forecasts(
+    client: httpx.AsyncClient, points: list[str], period: str
+) -> dict[str, dict | None]:
+    semaphore = asyncio.Semaphore(MAX_PARALLEL_REQUESTS)
+
+    async def request(point):
+        async with semaphore:
+            return await request_forecast(client, point, period)
+
+    forecasts = await asyncio.gather(*(request(point) for point in points))
+    return dict(zip(points, forecasts))
+
+
+async def request_trip(client: httpx.AsyncClient, points: list[str]) -> dict | None:
+    try:
+        response = await client.get(
+            f"{API_URL}/accu/route", params={"location": points}
+        )
+        if response.status_code == 200 and response.text.find("error") == -1:
+            return json.loads(response.text)
+    except httpx.RequestError:
+        pass
 
 
 async def generate_forecast_message(
@@ -102,14 +154,46 @@ async def generate_forecast_message(
 ) -> str:
     text = f"<b>{point}</b>\n<b>Прогноз на {period_human_readable}</b>"
 
-    for fc in forecast["units"]:
-        conditions = fc["conditions"]
-        description = fc["description"]
-        timestamp = datetime.fromisoformat(fc["date"]).strftime("%a %d %b %Y, %H:%M")
+    for date, description, temperature, humidity, precipitation, wind_speed in zip(
+        forecast["dates"],
+        forecast["descriptions"],
+        forecast["temperature_c"],
+        forecast["humidity_percent"],
+        forecast["precipitation_probability_percent"],
+        forecast["wind_speed_ms"],
+    ):
+        timestamp = datetime.fromisoformat(date).strftime("%a %d %b %Y, %H:%M")
 
         text += (
             f"\n\n<b>{timestamp}</b>\n"
             f"<i>{description}</i>\n"
+            f"Температура: {temperature:.2f} °C\n"
+            f"Влажность: {humidity:.2f}%\n"
+            f"Осадки: {precipitation:.2f}%\n"
+            f"Скорость ветра: {wind_speed:.2f} м/с\n"
+        )
+
+    return text
+
+
+async def generate_trip_message(trip: dict) -> str:
+    summary = "благоприятная" if trip["favorable"] else "неблагоприятная"
+    text = f"<b>Погода в пути</b>\nПогода для поездки {summary}"
+
+    for waypoint in trip["waypoints"]:
+        # время прибытия бэкенд возвращает в UTC
+        arrival = datetime.fromisoformat(waypoint["arrival"]).strftime(
+            "%a %d %b %Y, %H:%M UTC"
+        )
+        text += f"\n\n<b>{waypoint['geo']['name']}</b>, прибытие {arrival}\n"
+
+        if (weather := waypoint["weather"]) is None:
+            text += "Прогноза на это время нет\n"
+            continue
+
+        conditions = weather["conditions"]
+        text += (
+            f"<i>{weather['description']}</i>\n"
             f"Температура: {conditions['temperature_c']:.2f} °C\n"
             f"Влажность: {conditions['humidity_percent']:.2f}%\n"
             f"Осадки: {conditions['precipitation_probability_percent']:.2f}%\n"
@@ -119,18 +203,40 @@ async def generate_forecast_message(
     return text
 
 
+@dp.callback_query(F.data == "trip")
+async def callback_trip(
+    callback: types.CallbackQuery, state: FSMContext, http_client: httpx.AsyncClient
+):
+    data = await state.get_data()
+
+    # погоду в каждой точке ко времени прибытия туда бэкенд находит сам
+    trip = await request_trip(http_client, [data["first_point"], data["second_point"]])
+
+    if trip is None:
+        await callback.bot.send_message(
+            callback.message.chat.id,
+            "Произошла ошибка при попытке получить погоду на маршруте",
+        )
+        return
+
+    await callback.bot.send_message(
+        callback.message.chat.id,
+        await generate_trip_message(trip),
+        parse_mode=ParseMode.HTML,
+    )
+
+
 @dp.callback_query(F.data.startswith("forecast_"))
-async def callback_route(callback: types.CallbackQuery, state: FSMContext):
+async def callback_route(
+    callback: types.CallbackQuery, state: FSMContext, http_client: httpx.AsyncClient
+):
     period = callback.data.split("_")[1]
     period_human_readable = callback.data.split("_")[2]
     data = await state.get_data()
 
-    first_point, second_point = data["first_point"], data["second_point"]
+    points = [data["first_point"], data["second_point"]]
 
-    forecasts = {
-        first_point: await request_forecast(first_point, period),
-        second_point: await request_forecast(second_point, period),
-    }
+    forecasts = await request_forecasts(http_client, points, period)
 
     if not all(forecasts.values()):
         await callback.bot.send_message(
@@ -152,7 +258,13 @@ async def callback_route(callback: types.CallbackQuery, state: FSMContext):
 
 
 async def main():
-    await dp.start_polling(bot)
+    # Один клиент с общим пулом соединений на всё время работы бота,
+    # передаётся в обработчики как http_client
+    async with httpx.AsyncClient(
+        timeout=REQUEST_TIMEOUT,
+        limits=httpx.Limits(max_connections=MAX_PARALLEL_REQUESTS),
+    ) as http_client:
+        await dp.start_polling(bot, http_client=http_client)
 
 
 if __name__ == "__main__":
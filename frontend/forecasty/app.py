@@ -1,13 +1,38 @@
 import json
 import requests
+import threading
 import pandas as pd
 import plotly.graph_objs as go
 
 from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from dash import Dash, State, Input, Output, html, ctx, dcc, callback
 
 API_URL = "http://forecasty-backend:5000"
 
+# Сколько запросов к бэкенду по разным городам выполнять одновременно
+MAX_PARALLEL_REQUESTS = 8
+# Таймауты подключения и чтения ответа бэкенда в секундах
+REQUEST_TIMEOUT = (3.05, 30)
+
+# Общая сессия держит соединения с бэкендом открытыми между запросами
+session = requests.Session()
+session.mount(
+    "http://",
+    HTTPAdapter(
+        pool_connections=MAX_PARALLEL_REQUESTS, pool_maxsize=MAX_PARALLEL_REQUESTS
+    ),
+)
+
+executor = ThreadPoolExecutor(MAX_PARALLEL_REQUESTS)
+
+# Последние ответы бэкенда с их ETag: если данные не изменились, бэкенд
+# отвечает 304 без тела, и берётся сохранённый ответ
+MAX_CACHED_RESPONSES = 256
+cached_responses = OrderedDict()
+cached_responses_lock = threading.Lock()
+
 # Первый параметр: колонка, обозначающая погодное условие в api
 # Второй параметр: кортеж, обозначающий отображение погодного условия в графике
 GRAPH_PARAMS = OrderedDict(
@@ -22,6 +47,50 @@ GRAPH_PARAMS = OrderedDict(
     ]
 )
 
+
+def fetch_location(url, location, **params):
+    """
+    Возвращает ответ бэкенда по городу (или списку городов) или None, если его
+    не удалось получить
+    """
+
+    params = {"location": location, **params}
+    key = (url, json.dumps(params, sort_keys=True))
+    with cached_responses_lock:
+        cached = cached_responses.get(key)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    try:
+        response = session.get(
+            url, params=params, headers=headers, timeout=REQUEST_TIMEOUT
+        )
+        if response.status_code == 304 and cached:
+            return cached[1]
+        if response.status_code == 200 and response.text.find("error") == -1:
+            data = json.loads(response.text)
+            if etag := response.headers.get("ETag"):
+                with cached_responses_lock:
+                    cached_responses[key] = (etag, data)
+                    cached_responses.move_to_end(key)
+                    if len(cached_responses) > MAX_CACHED_RESPONSES:
+                        cached_responses.popitem(last=False)
+            return data
+    except requests.exceptions.RequestException:
+        pass
+    return None
+
+
+def fetch_locations(url, locations, **params):
+    """
+    Параллельно запрашивает данные по всем городам, сохраняя их порядок
+    """
+
+    return list(
+        executor.map(
+            lambda location: fetch_location(url, location, **params), locations
+        )
+    )
+
+
 app = Dash(__name__)
 
 app.layout = [
@@ -45,7 +114,10 @@ app.layout = [
                                                 name="enter-point",
                                                 type="text",
                                                 placeholder="Введите название города",
+                                                list="enter-point-suggestions",
+                                                debounce=0.3,
                                             ),
+                                            html.Datalist(id="enter-point-suggestions"),
                                             html.Button(
                                                 "+", id="add-btn", className="add-btn"
                                             ),
@@ -63,6 +135,12 @@ app.layout = [
                                                 className="check-btn",
                                                 style={"width": "100%"},
                                             ),
+                                            html.Button(
+                                                "Погода в пути",
+                                                id="trip-btn",
+                                                className="check-btn",
+                                                style={"width": "100%"},
+                                            ),
                                             html.Div(
                                                 [
                                                     html.Button(
@@ -105,8 +183,11 @@ app.layout = [
     State("enter-point", "value"),
     Input("add-btn", "n_clicks"),
     Input("current-btn", "n_clicks"),
+    Input("trip-btn", "n_clicks"),
 )
-def handle_routes(data, point_name, add_btn_clicks, current_btn_clicks):
+def handle_routes(
+    data, point_name, add_btn_clicks, current_btn_clicks, trip_btn_clicks
+):
     match ctx.triggered_id:
         case "add-btn":
             return json.dumps(
@@ -131,19 +212,29 @@ def handle_routes(data, point_name, add_btn_clicks, current_btn_clicks):
 
             routes = json.loads(data)
 
-            for route in routes:
-                try:
-                    response = requests.get(baseurl, params={"location": route["name"]})
-                    if (
-                        response.status_code == 200
-                        and response.text.find("error") == -1
-                    ):
-                        route["weather"] = json.loads(response.text)
-                        route["found"] = True
-                    else:
-                        route["found"] = False
-                except requests.exceptions.RequestException as e:
-                    route["found"] = False
+            weathers = fetch_locations(baseurl, [route["name"] for route in routes])
+
+            for route, weather in zip(routes, weathers):
+                route["weather"] = weather
+                route["found"] = weather is not None
+
+            return json.dumps(routes)
+        case "trip-btn":
+            if trip_btn_clicks == None:
+                return json.dumps([])
+
+            routes = json.loads(data)
+
+            # Бэкенд за один запрос находит погоду в каждом городе ко времени
+            # прибытия туда, если выехать сейчас
+            trip = fetch_location(
+                f"{API_URL}/accu/route", [route["name"] for route in routes]
+            )
+            waypoints = trip["waypoints"] if trip else [None] * len(routes)
+
+            for route, waypoint in zip(routes, waypoints):
+                route["weather"] = waypoint["weather"] if waypoint else None
+                route["found"] = route["weather"] is not None
 
             return json.dumps(routes)
     return json.dumps([])
@@ -154,6 +245,29 @@ def clear_point_entry(_n_clicks):
     return ""
 
 
+@callback(
+    Output("enter-point-suggestions", "children"),
+    Input("enter-point", "value"),
+)
+def suggest_points(prefix):
+    """
+    Подсказывает названия городов из справочника бэкенда по мере ввода
+    """
+
+    if not prefix:
+        return []
+    try:
+        response = session.get(
+            f"{API_URL}/geo/complete",
+            params={"prefix": prefix},
+            timeout=REQUEST_TIMEOUT,
+        )
+        locations = response.json().get("locations", [])
+    except (requests.exceptions.RequestException, ValueError):
+        return []
+    return [html.Option(value=location["name"]) for location in locations]
+
+
 def get_point_status(point):
     if point["found"] is None and point["weather"] is None:
         return {"color": "#f3f3f3", "status": ""}
@@ -270,19 +384,18 @@ def fullfill_forecast(forecast_five_clicks, forecast_twelve_clicks, route_data):
 
     dump = {}
 
-    for route in routes:
-        try:
-            response = requests.get(baseurl, params={"location": route["name"]})
-            if response.status_code == 200 and response.text.find("error") == -1:
-                raw_data = json.loads(response.text)
-                dump[route["name"]] = []
-                for unit in raw_data["units"]:
-                    city = {"date": unit["date"]}
-                    for condition, value in unit["conditions"].items():
-                        city[condition] = value
-                    dump[route["name"]].append(city)
-        except requests.exceptions.RequestException:
-            pass
+    # В компактном виде прогноз уже разложен по колонкам, как и нужно графикам
+    raw_forecasts = fetch_locations(
+        baseurl, [route["name"] for route in routes], format="compact"
+    )
+
+    for route, raw_data in zip(routes, raw_forecasts):
+        if raw_data is None:
+            continue
+        dump[route["name"]] = {
+            "date": raw_data["dates"],
+            **{column: raw_data[column] for column in GRAPH_PARAMS},
+        }
 
     return json.dumps(dump)
 